@@ -2,6 +2,7 @@
 """Redis Enterprise Credential Manager"""
 
 import argparse
+import csv
 import json
 import re
 import sys
@@ -9,20 +10,6 @@ from lib.credential_vault import CredentialVault
 from lib.key_vault import KeyVault
 from lib.resolver  import Resolver
 
-import os
-
-def list_files_in_folder(folder_path):
-    try:
-        # Get a list of all files in the folder
-        files = [f for f in os.listdir(folder_path) if os.path.isfile(os.path.join(folder_path, f))]
-        return files
-    except FileNotFoundError:
-        print(f"Error: The folder '{folder_path}' does not exist.")
-        return []
-    except PermissionError:
-        print(f"Error: Permission denied to access '{folder_path}'.")
-        return []
-
 
 def validate_fqdn(fqdn):
  
@@ -98,6 +85,135 @@ def recover_vault(secret):
         exit(-1)
 
 
+def pack_vault():
+    try:
+        count = CredentialVault.import_files()
+        print(f"{count} entries packed into {CredentialVault.container_file}")
+        print(f"The {CredentialVault.vault_dir} folder is no longer used and can be removed")
+    except Exception as e:
+        print(f"Fatal Error: {str(e)}")
+        exit(-1)
+
+
+def unpack_vault():
+    try:
+        if not CredentialVault.use_container():
+            print(f"{CredentialVault.container_file} not found, the vault is not packed")
+            return
+        count = CredentialVault.export_files()
+        print(f"{count} entries unpacked into the {CredentialVault.vault_dir} folder")
+    except Exception as e:
+        print(f"Fatal Error: {str(e)}")
+        exit(-1)
+
+
+def read_import_rows(fname, fmt=None):
+    """
+    Read the rows of an import file.
+
+    :param fname: A CSV file (fqdn,user,pwd[,ip], optional header) or a JSON lines file.
+    :param fmt: csv or jsonl (default: from the file extension, .json files are
+                read as JSON lines).
+    :return: A list of (line number, fqdn, user, pwd, ip, error).
+    """
+    if fmt is None:
+        fmt = "jsonl" if fname.lower().endswith((".jsonl", ".json", ".ndjson")) else "csv"
+        if fname.lower().endswith(".json"):
+            print(f"reading {fname} as JSON lines (one object per line)")
+    rows = []
+    with open(fname, "r", encoding="utf-8", newline="") as file:
+        if fmt == "jsonl":
+            for line_number, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                    fqdn, user, pwd = entry["fqdn"], entry["user"], entry["pwd"]
+                    ip = entry.get("ip")
+                    invalid = [key for key, value in (("fqdn", fqdn), ("user", user),
+                                                      ("pwd", pwd), ("ip", ip))
+                               if not isinstance(value, str)
+                               and not (key == "ip" and value is None)]
+                    if invalid:
+                        rows.append((line_number, None, None, None, None,
+                                     f"expecting strings for {', '.join(invalid)}"))
+                        continue
+                    rows.append((line_number, fqdn, user, pwd, ip, None))
+                except KeyError as e:
+                    rows.append((line_number, None, None, None, None, f"missing {e}"))
+                except (ValueError, TypeError) as e:
+                    rows.append((line_number, None, None, None, None, f"invalid entry: {e}"))
+        else:
+            for line_number, row in enumerate(csv.reader(file), 1):
+                row = [value.strip() for value in row]
+                if not row or not any(row):
+                    continue
+                if line_number == 1 and row[0].lower() == "fqdn":
+                    continue
+                if len(row) not in (3, 4):
+                    rows.append((line_number, None, None, None, None,
+                                 "expecting fqdn,user,pwd[,ip]"))
+                    continue
+                rows.append((line_number, row[0], row[1], row[2],
+                             row[3] if len(row) == 4 and row[3] else None, None))
+    return rows
+
+
+def import_credentials(fname, fmt=None, workers=8):
+    try:
+        rows = read_import_rows(fname, fmt)
+    except Exception as e:
+        print(f"Fatal Error: {str(e)}")
+        exit(-1)
+
+    credentials = {}
+    hosts = {}
+    lines = {}
+    failed = 0
+    for line_number, fqdn, user, pwd, ip, error in rows:
+        if error is None and not validate_fqdn(fqdn):
+            error = f"invalid fqdn format ({fqdn})"
+        if error is not None:
+            print(f"line {line_number}: {error}")
+            failed += 1
+            continue
+        if fqdn in credentials:
+            print(f"line {line_number}: duplicate fqdn {fqdn}, "
+                  f"already imported from line {lines[fqdn]}")
+            failed += 1
+            continue
+        credentials[fqdn] = (user, pwd)
+        lines[fqdn] = line_number
+        if ip:
+            hosts[fqdn] = ip
+
+    def progress(done, total):
+        if done == total or done % 100 == 0:
+            print(f"encrypted {done}/{total}")
+
+    try:
+        errors = CredentialVault.encrypt_many(credentials, workers, progress)
+    except Exception as e:
+        print(f"Fatal Error: {str(e)}")
+        exit(-1)
+    for fqdn, error in errors.items():
+        print(f"line {lines[fqdn]}: {fqdn}: {str(error)}")
+        hosts.pop(fqdn, None)
+    failed += len(errors)
+
+    if hosts:
+        resolver = Resolver()
+        resolver.load()
+        for fqdn, ip in hosts.items():
+            try:
+                resolver.save_host(fqdn, ip)
+            except ValueError as e:
+                print(f"line {lines[fqdn]}: {fqdn}: {str(e)}")
+        resolver.persist()
+
+    print(f"{len(credentials) - len(errors)} clusters imported, {failed} rows failed")
+
+
 def update_api_key(key):
     CredentialVault.encrypt_credentials(".api.key", "key", key)
 
@@ -145,6 +261,22 @@ def main():
     parser_list = subparsers.add_parser("del", help="Delete an FQDN in the Vault")
     parser_list.add_argument("--fqdn", help="fdqn to remove")
 
+    # Subparser for the 'import' command
+    parser_import = subparsers.add_parser(
+        "import", help="Add credentials for many clusters from a CSV or JSON lines file")
+    parser_import.add_argument(
+        "--file", help="fqdn,user,pwd[,ip] rows (CSV) or objects (JSON lines)", required=True)
+    parser_import.add_argument(
+        "--format", choices=["csv", "jsonl"], help="File format (default: from the extension)")
+    parser_import.add_argument(
+        "--workers", type=int, default=8, help="Concurrent encryptions (default: 8)")
+
+    # Subparsers for the vault container commands
+    subparsers.add_parser(
+        "pack", help=f"Move the vault folder into a single {CredentialVault.container_file} file")
+    subparsers.add_parser(
+        "unpack", help=f"Move {CredentialVault.container_file} back to one file per FQDN")
+
 
     args = parser.parse_args()
 
@@ -175,19 +307,23 @@ def main():
         print("API Key Saved")
     elif args.command == "list":
         fqdn_list = []
-        for fqdn in list_files_in_folder("vault"):            
+        for fqdn in CredentialVault.list_entries():
             if (validate_fqdn(fqdn)):
                 fqdn_list.append(fqdn)
         print(json.dumps(fqdn_list,indent=3))
     elif args.command == "del":
         print(f"Delete ({args.fqdn})")
         confirmChoice()
-        fname = f"vault/{args.fqdn}"
-        if os.path.exists(fname):
+        if CredentialVault.delete_entry(args.fqdn):
             print(f"deleting entry({args.fqdn})")
-            os.remove(fname)
         else:
             print(f"no matching fqdn")
+    elif args.command == "import":
+        import_credentials(args.file, args.format, args.workers)
+    elif args.command == "pack":
+        pack_vault()
+    elif args.command == "unpack":
+        unpack_vault()
     else:
         parser.print_help()
 
@@ -0,0 +1,122 @@
+"""api cache module"""
+import gzip
+import json
+import os
+import threading
+import time
+
+
+class CachedResponse:
+    """Response replayed from the api cache"""
+
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+
+    @property
+    def text(self):
+        """the response body as str"""
+        return self.content.decode("utf-8")
+
+    def json(self):
+        """decode the response body"""
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        """cached responses are always successful"""
+
+
+class ApiCache:
+    """
+    Cache of REST API responses, keyed by cluster and endpoint.
+    Responses are kept in memory while a cluster is processed and dropped
+    with forget once it is done, so a fleet run does not accumulate the
+    bodies of every cluster. With a ttl they are also
+    stored gzip compressed under cache_dir and reused by later runs until
+    they expire; offline runs use stored responses whatever their age.
+    """
+    cache_dir = "cache"
+    ttl = 0
+    offline = False
+
+    memory = {}
+    lock = threading.Lock()
+
+    @staticmethod
+    def configure(ttl=0, offline=False, cache_dir=None):
+        """
+        Configure the cache for the run.
+
+        :param ttl: Seconds a stored response stays valid (0 disables the disk cache).
+        :param offline: Never call the API, only use stored responses.
+        :param cache_dir: Directory of stored responses.
+        """
+        ApiCache.ttl = ttl
+        ApiCache.offline = offline
+        if cache_dir is not None:
+            ApiCache.cache_dir = cache_dir
+
+    @staticmethod
+    def get_fname(fqdn, api_path):
+        """file name of a stored response"""
+        endpoint = api_path.strip("/").replace("/", "_").replace("?", "_")
+        return os.path.join(ApiCache.cache_dir, fqdn, endpoint + ".json.gz")
+
+    @staticmethod
+    def get(fqdn, api_path):
+        """
+        Get a cached response body.
+
+        :return: The response body as bytes, or None when it is not cached (or expired).
+        """
+        key = (fqdn, api_path)
+        with ApiCache.lock:
+            content = ApiCache.memory.get(key)
+        if content is not None:
+            return content
+        if ApiCache.ttl <= 0 and not ApiCache.offline:
+            return None
+
+        fname = ApiCache.get_fname(fqdn, api_path)
+        try:
+            age = time.time() - os.path.getmtime(fname)
+            if not ApiCache.offline and age > ApiCache.ttl:
+                return None
+            with gzip.open(fname, 'rb') as file:
+                content = file.read()
+        except (OSError, EOFError):
+            return None
+
+        with ApiCache.lock:
+            ApiCache.memory[key] = content
+        return content
+
+    @staticmethod
+    def put(fqdn, api_path, content):
+        """cache a response body (bytes)"""
+        with ApiCache.lock:
+            ApiCache.memory[(fqdn, api_path)] = content
+        if ApiCache.ttl <= 0:
+            return
+
+        fname = ApiCache.get_fname(fqdn, api_path)
+        os.makedirs(os.path.dirname(fname), exist_ok=True)
+        part = f"{fname}.{threading.get_ident()}.part"
+        try:
+            # responses describe the cluster configuration, keep them private
+            handle = os.open(part, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(handle, 'wb') as raw:
+                with gzip.open(raw, 'wb') as file:
+                    file.write(content)
+            os.replace(part, fname)
+        except OSError as e:
+            print(f"Warning:{fqdn}:{api_path}:Could not cache response:{e}")
+            if os.path.exists(part):
+                os.remove(part)
+
+    @staticmethod
+    def forget(fqdn):
+        """drop the in-memory responses of a cluster (stored responses are kept)"""
+        with ApiCache.lock:
+            for key in [key for key in ApiCache.memory if key[0] == fqdn]:
+                del ApiCache.memory[key]
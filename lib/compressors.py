@@ -0,0 +1,144 @@
+"""compressors module"""
+import os
+import lzma
+import struct
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    # python 3.14 and higher
+    from compression import zstd
+except ImportError:
+    zstd = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class ParallelGzipWriter:
+    """
+    pigz style gzip writer.
+    Input is cut into blocks that are deflated independently on a thread pool
+    (zlib releases the GIL) and concatenated, in order, into one gzip member.
+    Each block is primed with the last 32KB of the previous block so the
+    compression ratio stays close to a single threaded stream.
+    """
+    window = 32 * 1024
+
+    def __init__(self, fileobj, level=9, workers=None, block_size=1024 * 1024):
+        """
+        Initialize the ParallelGzipWriter class.
+
+        :param fileobj: Writable binary file object receiving the gzip stream.
+        :param level: Compression level (1-9).
+        :param workers: Number of compression threads (default one per cpu).
+        :param block_size: Size of the independently compressed blocks.
+        """
+        self.fileobj = fileobj
+        self.level = level
+        self.block_size = block_size
+        self.workers = workers if workers else (os.cpu_count() or 1)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.pending = deque()
+        self.buffer = bytearray()
+        self.dictionary = b""
+        self.crc = 0
+        self.size = 0
+        self.closed = False
+        # gzip header: deflate, no flags, mtime, no extra flags, unknown os
+        self.fileobj.write(b"\x1f\x8b\x08\x00" + struct.pack("<I", int(time.time())) + b"\x00\xff")
+
+    @staticmethod
+    def deflate(data, dictionary, level, last):
+        """deflate a block as part of a larger raw deflate stream"""
+        if dictionary:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS,
+                                          zdict=dictionary)
+        else:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        # a sync flush ends the block on a byte boundary without ending the stream
+        return compressor.compress(data) + compressor.flush(
+            zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+    def submit(self, data, last=False):
+        """queue a block for compression, writing finished blocks in order"""
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += len(data)
+        self.pending.append(self.executor.submit(
+            ParallelGzipWriter.deflate, data, self.dictionary, self.level, last))
+        self.dictionary = bytes(data[-self.window:])
+        # bound the memory held by blocks in flight
+        while len(self.pending) > self.workers * 2:
+            self.fileobj.write(self.pending.popleft().result())
+
+    def write(self, data):
+        """write uncompressed data"""
+        self.buffer += data
+        while len(self.buffer) >= self.block_size:
+            self.submit(bytes(self.buffer[:self.block_size]))
+            del self.buffer[:self.block_size]
+        return len(data)
+
+    def close(self):
+        """compress the remaining data and write the gzip trailer"""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.submit(bytes(self.buffer), last=True)
+            self.buffer = bytearray()
+            while self.pending:
+                self.fileobj.write(self.pending.popleft().result())
+            self.fileobj.write(struct.pack("<II", self.crc, self.size & 0xffffffff))
+        finally:
+            self.executor.shutdown()
+
+
+class Compressors:
+    """Compression backends for reduced support packages"""
+    suffixes = {"gz": ".tar.gz", "xz": ".tar.xz", "zst": ".tar.zst"}
+    default_levels = {"gz": 9, "xz": 6, "zst": 10}
+
+    @staticmethod
+    def available():
+        """list the compression backends supported by this interpreter"""
+        codecs = ["gz", "xz"]
+        if zstd is not None or zstandard is not None:
+            codecs.append("zst")
+        return codecs
+
+    @staticmethod
+    def suffix(codec):
+        """file suffix for a compression backend"""
+        return Compressors.suffixes[codec]
+
+    @staticmethod
+    def open_writer(fileobj, codec="gz", level=None, workers=None):
+        """
+        Wrap fileobj in a compressing writer. Closing the writer does not
+        close fileobj.
+
+        :param fileobj: Writable binary file object.
+        :param codec: One of gz, xz or zst.
+        :param level: Compression level (default depends on the backend).
+        :param workers: Compression threads for backends that support them.
+        :return: A writable file object.
+        """
+        if codec not in Compressors.available():
+            raise ValueError(f"Compression '{codec}' is not available")
+        if level is None:
+            level = Compressors.default_levels[codec]
+
+        if codec == "gz":
+            return ParallelGzipWriter(fileobj, level=level, workers=workers)
+        if codec == "xz":
+            return lzma.LZMAFile(fileobj, "wb", preset=level)
+        if zstandard is not None:
+            threads = workers if workers else -1
+            return zstandard.ZstdCompressor(level=level, threads=threads).stream_writer(
+                fileobj, closefd=False)
+        return zstd.ZstdFile(fileobj, "wb", level=level)
@@ -1,12 +1,25 @@
 """Credential Vault Module"""
+import json
 import os
-from cryptography.fernet import Fernet
-from lib.key_vault import KeyVault
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from lib.key_vault import VaultSession
 
 
 class CredentialVault:
-    """Credential Vault Class"""
+    """
+    Credential Vault Class.
+    Credentials are stored as Fernet tokens, either in one file per cluster
+    under vault_dir or, when container_file exists, in a single indexed
+    container file holding every entry. The container is read once per
+    process, so lookups and pattern selection do not touch the file system.
+    """
     vault_dir = "vault"
+    container_file = "vault.json"
+    container_format = "rflat-vault"
+
+    container = None
+    lock = threading.Lock()
 
     @staticmethod
     def get_vault_dir():
@@ -16,25 +29,216 @@ class CredentialVault:
         return CredentialVault.vault_dir
 
     @staticmethod
-    def encrypt_credentials(cluster_fqdn, username, password):
-        """Encrypt Credentials"""
-        cipher_suite = Fernet(KeyVault.get_key())
+    def use_container():
+        """the vault is a single container file"""
+        return os.path.isfile(CredentialVault.container_file)
+
+    @staticmethod
+    def load_container():
+        """entries of the container file (name to [username token, password token])"""
+        with CredentialVault.lock:
+            if CredentialVault.container is None:
+                if os.path.isfile(CredentialVault.container_file):
+                    with open(CredentialVault.container_file, 'r', encoding='utf-8') as file:
+                        container = json.load(file)
+                    if container.get("format") != CredentialVault.container_format:
+                        raise ValueError(
+                            f"{CredentialVault.container_file} is not a credential vault")
+                    CredentialVault.container = container["entries"]
+                else:
+                    CredentialVault.container = {}
+            return CredentialVault.container
+
+    @staticmethod
+    def save_container(entries):
+        """atomically replace the container file"""
+        part = CredentialVault.container_file + ".part"
+        handle = os.open(part, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(handle, 'w', encoding='utf-8') as file:
+            json.dump({"format": CredentialVault.container_format, "version": 1,
+                       "entries": entries}, file, indent=1, sort_keys=True)
+        os.replace(part, CredentialVault.container_file)
+        with CredentialVault.lock:
+            CredentialVault.container = entries
+
+    @staticmethod
+    def list_entries():
+        """names of all entries in the vault"""
+        if CredentialVault.use_container():
+            return list(CredentialVault.load_container())
+        vault_path = CredentialVault.get_vault_dir()
+        return [name for name in os.listdir(vault_path)
+                if os.path.isfile(os.path.join(vault_path, name))]
+
+    @staticmethod
+    def has_entry(name):
+        """check for an entry in the vault"""
+        if CredentialVault.use_container():
+            return name in CredentialVault.load_container()
+        return os.path.isfile(os.path.join(CredentialVault.get_vault_dir(), name))
+
+    @staticmethod
+    def read_entry(name):
+        """encrypted username and password of an entry"""
+        if CredentialVault.use_container():
+            tokens = CredentialVault.load_container().get(name)
+            if tokens is None:
+                raise KeyError(f"No credentials in vault for {name}")
+            return tokens[0], tokens[1]
+        fname = os.path.join(CredentialVault.get_vault_dir(), name)
+        with open(fname, 'r', encoding='utf-8') as file:
+            encrypted_username = file.readline().strip()
+            encrypted_password = file.readline().strip()
+        return encrypted_username, encrypted_password
+
+    @staticmethod
+    def write_entries(entries):
+        """
+        Store encrypted entries.
+
+        :param entries: A dictionary of name to (username token, password token).
+        """
+        if CredentialVault.use_container():
+            container = dict(CredentialVault.load_container())
+            container.update({name: list(tokens) for name, tokens in entries.items()})
+            CredentialVault.save_container(container)
+            return
+        for name, (encrypted_username, encrypted_password) in entries.items():
+            fname = os.path.join(CredentialVault.get_vault_dir(), name)
+            with open(fname, 'w', encoding='utf-8') as file:
+                file.write(encrypted_username + "\n")
+                file.write(encrypted_password + "\n")
+
+    @staticmethod
+    def delete_entry(name):
+        """
+        Remove an entry from the vault.
+
+        :return: True if the entry existed.
+        """
+        if CredentialVault.use_container():
+            container = dict(CredentialVault.load_container())
+            if container.pop(name, None) is None:
+                return False
+            CredentialVault.save_container(container)
+            return True
+        fname = os.path.join(CredentialVault.get_vault_dir(), name)
+        if not os.path.isfile(fname):
+            return False
+        os.remove(fname)
+        return True
+
+    @staticmethod
+    def encrypt(username, password):
+        """encrypt a username and password with the session cipher"""
+        cipher_suite = VaultSession.get_cipher()
         encrypted_username = cipher_suite.encrypt(username.encode()).decode()
         encrypted_password = cipher_suite.encrypt(password.encode()).decode()
-        fname = os.path.join(CredentialVault.get_vault_dir(), cluster_fqdn)
-        with open(fname, 'w', encoding='utf-8') as file:
-            file.write(encrypted_username + "\n")
-            file.write(encrypted_password + "\n")
+        return encrypted_username, encrypted_password
+
+    @staticmethod
+    def encrypt_credentials(cluster_fqdn, username, password):
+        """Encrypt Credentials"""
+        CredentialVault.write_entries(
+            {cluster_fqdn: CredentialVault.encrypt(username, password)})
+
+    @staticmethod
+    def encrypt_many(credentials, workers=8, progress=None):
+        """
+        Encrypt and store the credentials of several clusters.
+        The master key is unlocked once, entries are encrypted concurrently
+        and the vault is written a single time.
+
+        :param credentials: A dictionary of fqdn to (username, password).
+        :param workers: Number of encryption threads.
+        :param progress: Optional callable(done, total) called as entries are encrypted.
+        :return: A dictionary of fqdn to the exception raised for it.
+        """
+        entries = {}
+        errors = {}
+        VaultSession.get_cipher()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(CredentialVault.encrypt, username, password): fqdn
+                       for fqdn, (username, password) in credentials.items()}
+            for done, future in enumerate(as_completed(futures), 1):
+                fqdn = futures[future]
+                try:
+                    entries[fqdn] = future.result()
+                except Exception as e:
+                    errors[fqdn] = e
+                if progress:
+                    progress(done, len(futures))
+        if entries:
+            CredentialVault.write_entries(entries)
+        return errors
 
     @staticmethod
     def decrypt_credentials(cluster_fqdn):
         """Decrypt Credentials"""
-        fname = os.path.join(CredentialVault.get_vault_dir(), cluster_fqdn)
-        with open(fname, 'r', encoding='utf-8') as file:
-            encrypted_username = file.readline()
-            encrypted_password = file.readline()
-            cipher_suite = Fernet(KeyVault.get_key())
+        encrypted_username, encrypted_password = CredentialVault.read_entry(cluster_fqdn)
+        cipher_suite = VaultSession.get_cipher()
         username = cipher_suite.decrypt(encrypted_username.encode()).decode()
         password = cipher_suite.decrypt(encrypted_password.encode()).decode()
         return username, password
-    
\ No newline at end of file
+
+    @staticmethod
+    def decrypt_many(cluster_fqdns):
+        """
+        Decrypt the credentials of several clusters up front.
+        A cluster that cannot be decrypted does not prevent the others.
+
+        :param cluster_fqdns: List of cluster fqdns.
+        :return: A tuple containing a dictionary of fqdn to (username, password)
+                 and a dictionary of fqdn to the exception raised for it.
+        """
+        credentials = {}
+        errors = {}
+        # a missing master key fails every cluster, raise it once
+        VaultSession.get_cipher()
+        for cluster_fqdn in cluster_fqdns:
+            try:
+                credentials[cluster_fqdn] = CredentialVault.decrypt_credentials(cluster_fqdn)
+            except Exception as e:
+                errors[cluster_fqdn] = e
+        return credentials, errors
+
+    @staticmethod
+    def import_files():
+        """
+        Create (or update) the container file from the per file vault.
+        The per file vault is left in place.
+
+        :return: The number of imported entries.
+        """
+        vault_path = CredentialVault.get_vault_dir()
+        entries = {}
+        for name in os.listdir(vault_path):
+            fname = os.path.join(vault_path, name)
+            if not os.path.isfile(fname):
+                continue
+            with open(fname, 'r', encoding='utf-8') as file:
+                entries[name] = [file.readline().strip(), file.readline().strip()]
+        container = dict(CredentialVault.load_container())
+        container.update(entries)
+        CredentialVault.save_container(container)
+        return len(entries)
+
+    @staticmethod
+    def export_files():
+        """
+        Write every container entry to the per file vault and remove the
+        container file, switching the vault back to one file per cluster.
+
+        :return: The number of exported entries.
+        """
+        container = CredentialVault.load_container()
+        vault_path = CredentialVault.get_vault_dir()
+        for name, (encrypted_username, encrypted_password) in container.items():
+            fname = os.path.join(vault_path, name)
+            with open(fname, 'w', encoding='utf-8') as file:
+                file.write(encrypted_username + "\n")
+                file.write(encrypted_password + "\n")
+        os.remove(CredentialVault.container_file)
+        with CredentialVault.lock:
+            CredentialVault.container = None
+        return len(container)
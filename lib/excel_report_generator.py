@@ -1,5 +1,8 @@
 """Excel Audit Report Generator"""
+import json
+import tempfile
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.utils import get_column_letter
 from openpyxl.styles import Font
 
@@ -7,17 +10,28 @@ from openpyxl.styles import Font
 class ExcelReportGenerator:
     """Excel Report Generator Class"""
 
-    def __init__(self):
+    def __init__(self, write_only=False):
         """
         Initialize the generator with an empty workbook.
+
+        :param write_only: Stream rows instead of holding every cell in memory.
+                           Rows added to a sheet are spooled to a temporary file
+                           and written to a write-only workbook on save, once
+                           the column widths are known.
         """
         self.workbook = None
+        self.write_only = write_only
+        # per sheet: column headers, column widths and spooled rows (write only)
+        self.headers = {}
+        self.widths = {}
+        self.spools = {}
+        self.tab_colors = {}
 
     def create_workbook(self):
         """
         Create a new workbook.
         """
-        self.workbook = Workbook()
+        self.workbook = Workbook(write_only=self.write_only)
         # print("New workbook created.")
 
     def create_sheet(self, sheet_name,tab_color=None):
@@ -30,6 +44,12 @@ class ExcelReportGenerator:
             raise ValueError(
                 "Workbook not created. Please create a workbook first using CreateWorkbook method.")
 
+        if self.write_only:
+            # the worksheet itself is written on save
+            self.spools[sheet_name] = tempfile.TemporaryFile("w+", encoding="utf-8")
+            self.tab_colors[sheet_name] = tab_color
+            return
+
         # If the workbook has the default sheet, remove it if this is the first
         # sheet being added.
         if len(self.workbook.sheetnames) == 1 and self.workbook.active.title == "Sheet":
@@ -39,6 +59,16 @@ class ExcelReportGenerator:
         ws.sheet_properties.tabColor = tab_color
         # print(f"Sheet '{sheet_name}' created.")
 
+    def update_widths(self, sheet_name, values):
+        """widen the columns of a sheet to fit a new row"""
+        widths = self.widths.setdefault(sheet_name, [])
+        for col, value in enumerate(values):
+            length = len(str(value))
+            if col == len(widths):
+                widths.append(length)
+            elif length > widths[col]:
+                widths[col] = length
+
     def add_data(self, sheet_name, data):
         """
         :param sheet_name: The name of the sheet where data should be added.
@@ -48,35 +78,65 @@ class ExcelReportGenerator:
             raise ValueError(
                 "Workbook not created. Please create a workbook first using CreateWorkbook method.")
 
-        if sheet_name not in self.workbook.sheetnames:
+        sheet_names = self.spools if self.write_only else self.workbook.sheetnames
+        if sheet_name not in sheet_names:
             raise ValueError(
                 f"Sheet '{sheet_name}' does not exist. Please create the sheet first using CreateSheet method.")
 
-        sheet = self.workbook[sheet_name]
         if not data:
             return
 
         # Write headers only if the sheet is empty
-        if sheet.max_row == 1 and sheet["A1"].value is None:
+        if sheet_name not in self.headers:
             headers = list(data[0].keys())
-            for col_num, header in enumerate(headers, start=1):
-                cell = sheet.cell(row=1, column=col_num, value=header)
-                cell.font = Font(bold=True)
+            self.headers[sheet_name] = headers
+            self.update_widths(sheet_name, headers)
+            if not self.write_only:
+                sheet = self.workbook[sheet_name]
+                for col_num, header in enumerate(headers, start=1):
+                    cell = sheet.cell(row=1, column=col_num, value=header)
+                    cell.font = Font(bold=True)
 
         # Write data rows
         for row in data:
-            sheet.append(list(row.values()))
-
-        # Adjust column width
-        headers = list(data[0].keys())
-        for col in range(1, len(headers) + 1):
-            column_letter = get_column_letter(col)
-            max_length = max(len(str(cell.value))
-                             for cell in sheet[column_letter])
-            sheet.column_dimensions[column_letter].width = max_length + 2
+            values = list(row.values())
+            self.update_widths(sheet_name, values)
+            if self.write_only:
+                self.spools[sheet_name].write(json.dumps(values, default=str) + "\n")
+            else:
+                self.workbook[sheet_name].append(values)
+
+        if not self.write_only:
+            # Adjust column width
+            sheet = self.workbook[sheet_name]
+            for col, width in enumerate(self.widths[sheet_name], start=1):
+                sheet.column_dimensions[get_column_letter(col)].width = width + 2
 
         # print(f"Data added to sheet '{sheet_name}'.")
 
+    def write_sheets(self):
+        """write the spooled rows to write-only worksheets"""
+        for sheet_name, spool in self.spools.items():
+            ws = self.workbook.create_sheet(title=sheet_name)
+            ws.sheet_properties.tabColor = self.tab_colors[sheet_name]
+            # column widths must be set before the first row is written
+            for col, width in enumerate(self.widths.get(sheet_name, []), start=1):
+                ws.column_dimensions[get_column_letter(col)].width = width + 2
+
+            if sheet_name in self.headers:
+                header_cells = []
+                for header in self.headers[sheet_name]:
+                    cell = WriteOnlyCell(ws, value=header)
+                    cell.font = Font(bold=True)
+                    header_cells.append(cell)
+                ws.append(header_cells)
+
+            spool.seek(0)
+            for line in spool:
+                ws.append(json.loads(line))
+            spool.close()
+        self.spools = {}
+
     def save_workbook(self, file_name='report.xlsx'):
         """
         Save the workbook to a file.
@@ -87,6 +147,7 @@ class ExcelReportGenerator:
             raise ValueError(
                 "Workbook not created. Please create a workbook first using CreateWorkbook method.")
 
+        if self.write_only:
+            self.write_sheets()
         self.workbook.save(file_name)
         return file_name
-    
\ No newline at end of file
@@ -1,12 +1,16 @@
 """FilesUploader Module"""
 import os
+import time
 import files_sdk
 from lib.credential_vault import CredentialVault
+from lib.resilience import RetryPolicy
 
 
 class FilesUploader:
     """Files Uploader Class"""
     destination_path = "/RLEC_Customers/Uploads"
+    # attempts of an upload, failed transfers included
+    attempts = 5
     # destination_path = "/Uploads"
 
     @staticmethod
@@ -19,9 +23,9 @@ class FilesUploader:
             raise Exception("API Key") from e
 
     @staticmethod
-    def upload_file(source_file):
-        """Upload source_file """
-        fname = os.path.basename(source_file)
+    def upload_file(source_file, remote_name=None):
+        """Upload source_file, optionally under a different remote name"""
+        fname = os.path.basename(remote_name if remote_name else source_file)
         remote_file = os.path.join(FilesUploader.destination_path, fname)
         FilesUploader.set_api_key()
         try:
@@ -31,14 +35,29 @@ class FilesUploader:
             raise Exception("Upload Error") from e
 
     @staticmethod
-    def upload_bytes(source_bytes, source_file):
-        """Upload a string using source_file as destination name"""
-        try:
-            fname = os.path.basename(source_file)
-            remote_file = os.path.join(FilesUploader.destination_path, fname)
-            FilesUploader.set_api_key()
-            with files_sdk.open(remote_file, "wb") as f:
-                f.write(source_bytes)
-        except Exception as e:
-            print(e)
-            raise Exception("Upload Error") from e
+    def upload_with_retry(logger, source_file, remote_name=None):
+        """
+        Upload source_file from disk, retrying failed transfers with a
+        jittered backoff.
+
+        :return: A tuple containing the uploaded size in MB and the upload rate in MB/s.
+        """
+        name = os.path.basename(remote_name if remote_name else source_file)
+        attempt = 0
+        while True:
+            attempt += 1
+            start = time.monotonic()
+            try:
+                FilesUploader.upload_file(source_file, remote_name)
+                break
+            except Exception as e:
+                if attempt >= FilesUploader.attempts:
+                    raise
+                delay = RetryPolicy.delay(attempt)
+                logger.info(f"({name}):Upload failed ({e.__cause__ or e}), "
+                            f"retrying in {delay:.1f}s")
+                time.sleep(delay)
+        elapsed = time.monotonic() - start
+        size = os.path.getsize(source_file) / 1024 / 1024
+        rate = round(size / elapsed, 1) if elapsed > 0 else 0
+        return round(size, 1), rate
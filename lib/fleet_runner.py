@@ -0,0 +1,58 @@
+"""fleet runner module"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+class FleetRunner:
+    """Fleet Runner Class"""
+
+    def __init__(self, logger, workers=1):
+        """
+        Initialize the FleetRunner class.
+
+        :param logger: Logger used to report per cluster failures.
+        :param workers: Number of clusters processed in parallel.
+        """
+        self.logger = logger
+        self.workers = max(1, int(workers))
+        # serialize console output (json/tables) produced by parallel tasks
+        self.output_lock = threading.Lock()
+        # exception raised by the task of each failed fqdn
+        self.errors = {}
+
+    def run_one(self, task, fqdn):
+        """run task for a single fqdn, never raises"""
+        try:
+            task(fqdn)
+            return True
+        except Exception as e:
+            self.logger.exception(e, f"({fqdn}):Error during Request")
+            self.errors[fqdn] = e
+            return False
+
+    def run(self, fqdns, task):
+        """
+        Run task(fqdn) for every fqdn on a bounded worker pool.
+        A failing cluster is logged and does not stop the others.
+
+        :param fqdns: List of cluster fqdns.
+        :param task: Callable taking a single fqdn.
+        :return: A tuple containing the lists of succeeded and failed fqdns.
+        """
+        succeeded = []
+        failed = []
+
+        if self.workers == 1 or len(fqdns) < 2:
+            for fqdn in fqdns:
+                (succeeded if self.run_one(task, fqdn) else failed).append(fqdn)
+            return succeeded, failed
+
+        with ThreadPoolExecutor(max_workers=self.workers,
+                                thread_name_prefix="rflat") as executor:
+            futures = {executor.submit(self.run_one, task, fqdn): fqdn
+                       for fqdn in fqdns}
+            for future in as_completed(futures):
+                fqdn = futures[future]
+                (succeeded if future.result() else failed).append(fqdn)
+
+        return succeeded, failed
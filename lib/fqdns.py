@@ -1,5 +1,5 @@
 """fqdns module"""
-import os
+import hashlib
 import re
 from lib.credential_vault import CredentialVault
 
@@ -26,15 +26,40 @@ class FQDNs:
     @staticmethod
     def get(pattern):
         """Get Filesnames that match pattern"""
-        fqdn_files = []
+        if '*' not in pattern:
+            # a plain fqdn is a direct lookup in the vault
+            if FQDNs.FQDN_PATTERN.match(pattern) and CredentialVault.has_entry(pattern):
+                return [pattern]
+            return []
 
-        vault_path = CredentialVault.get_vault_dir()
-        files = FQDNs.match_filenames(os.listdir(vault_path), pattern)
+        files = FQDNs.match_filenames(CredentialVault.list_entries(), pattern)
 
-        for filename in files:
-            # Check if the filename matches the FQDN pattern
-            if FQDNs.FQDN_PATTERN.match(filename):
-                fqdn_files.append(filename)
+        # Keep the filenames that match the FQDN pattern
+        return [filename for filename in files if FQDNs.FQDN_PATTERN.match(filename)]
 
-        return fqdn_files
-    
\ No newline at end of file
+    @staticmethod
+    def parse_shard(shard):
+        """
+        Parse a shard specification.
+
+        :param shard: "i/N", the i-th of N shards (1 based).
+        :return: A tuple containing the shard index and the shard count.
+        """
+        try:
+            index, count = (int(value) for value in shard.split("/"))
+        except ValueError:
+            raise ValueError(f"Invalid shard ({shard}), expecting i/N") from None
+        if count < 1 or not 1 <= index <= count:
+            raise ValueError(f"Invalid shard ({shard}), expecting 1 <= i <= N")
+        return index, count
+
+    @staticmethod
+    def shard_of(fqdn, count):
+        """stable shard (1 based) of a fqdn, the same on every host and run"""
+        digest = hashlib.sha256(fqdn.strip().lower().encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big") % count + 1
+
+    @staticmethod
+    def shard(fqdns, index, count):
+        """fqdns placed in a shard"""
+        return [fqdn for fqdn in fqdns if FQDNs.shard_of(fqdn, count) == index]
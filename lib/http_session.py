@@ -0,0 +1,104 @@
+"""http session module"""
+import atexit
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+requests.packages.urllib3.disable_warnings()
+
+
+class HttpSessions:
+    """Keep-alive HTTP sessions, one connection pool per cluster"""
+    # (connect, read) timeouts of each endpoint class: debuginfo requests
+    # wait for the cluster to collect logs, json requests answer quickly
+    timeouts = {
+        "json": (5, 60),
+        "debuginfo": (10, 500),
+    }
+    # enough connections for the concurrent inventory requests of a cluster
+    pool_size = 8
+
+    sessions = {}
+    latency = {}
+    lock = threading.Lock()
+
+    @staticmethod
+    def get_session(host, username, password):
+        """get (or create) the pooled session for a cluster"""
+        key = (host, username)
+        with HttpSessions.lock:
+            session = HttpSessions.sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                session.auth = (username, password)
+                adapter = HTTPAdapter(pool_connections=1,
+                                      pool_maxsize=HttpSessions.pool_size)
+                session.mount("https://", adapter)
+                HttpSessions.sessions[key] = session
+            return session
+
+    @staticmethod
+    def endpoint_class(endpoint):
+        """timeout class of an api path"""
+        return "debuginfo" if "/debuginfo" in endpoint else "json"
+
+    @staticmethod
+    def get(host, username, password, url, endpoint, stream=False, headers=None):
+        """
+        Issue a GET on the cluster's pooled session and record its latency.
+
+        :param host: Host (fqdn or ip) used as the pool key.
+        :param url: Full request url.
+        :param endpoint: Api path used to aggregate latency.
+        :param stream: Do not read the response body up front.
+        :param headers: Additional request headers (Range for instance).
+        :return: The requests response.
+        """
+        session = HttpSessions.get_session(host, username, password)
+        start = time.perf_counter()
+        try:
+            # verify is passed per request, a session level value is
+            # overridden by REQUESTS_CA_BUNDLE
+            return session.get(url, stream=stream, verify=False, headers=headers,
+                               timeout=HttpSessions.timeouts[
+                                   HttpSessions.endpoint_class(endpoint)])
+        finally:
+            HttpSessions.record(endpoint, time.perf_counter() - start)
+
+    @staticmethod
+    def record(endpoint, elapsed):
+        """record a request latency for an endpoint"""
+        with HttpSessions.lock:
+            stats = HttpSessions.latency.setdefault(
+                endpoint, {"count": 0, "total": 0.0, "min": elapsed, "max": elapsed})
+            stats["count"] += 1
+            stats["total"] += elapsed
+            stats["min"] = min(stats["min"], elapsed)
+            stats["max"] = max(stats["max"], elapsed)
+
+    @staticmethod
+    def latency_report():
+        """per endpoint latency summary in ms, slowest average first"""
+        report = []
+        with HttpSessions.lock:
+            for endpoint, stats in HttpSessions.latency.items():
+                report.append({
+                    "endpoint": endpoint,
+                    "requests": stats["count"],
+                    "avg_ms": round(stats["total"] * 1000 / stats["count"], 1),
+                    "min_ms": round(stats["min"] * 1000, 1),
+                    "max_ms": round(stats["max"] * 1000, 1),
+                })
+        return sorted(report, key=lambda x: x["avg_ms"], reverse=True)
+
+    @staticmethod
+    def close_all():
+        """close all pooled connections"""
+        with HttpSessions.lock:
+            for session in HttpSessions.sessions.values():
+                session.close()
+            HttpSessions.sessions.clear()
+
+
+atexit.register(HttpSessions.close_all)
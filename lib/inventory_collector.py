@@ -0,0 +1,124 @@
+"""inventory collector module"""
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from .support_package import SupportPackage
+from .http_session import HttpSessions
+from .json_decoder import JsonDecoder
+
+
+class InventoryCollector:
+    """
+    Inventory Collector Class.
+    Collects the inventory of a cluster with a dependency aware fetch plan:
+    the REST endpoints are requested concurrently and each sheet is built
+    as soon as the endpoints it depends on have arrived, so the time spent
+    on a cluster approaches the time of its slowest endpoint.
+    """
+    endpoints = ("/v1/license", "/v1/cluster", "/v1/bdbs", "/v1/nodes",
+                 "/v1/shards", "/v1/roles", "/v1/redis_acls")
+
+    # sheet, builder(fqdn, *inputs), input endpoints
+    plan = (
+        ("Clusters", SupportPackage.summarize_cluster,
+         ("/v1/license", "/v1/cluster", "/v1/nodes")),
+        ("Nodes", SupportPackage.deserialize_nodes, ("/v1/nodes",)),
+        ("Shards", SupportPackage.deserialize_shards, ("/v1/bdbs", "/v1/shards")),
+        ("Certificates", SupportPackage.get_certificate_info, ("/v1/bdbs", "/v1/cluster")),
+        ("Ciphers", SupportPackage.get_ciphers, ("/v1/cluster",)),
+        ("Roles", SupportPackage.deserialize_roles, ("/v1/roles",)),
+        ("Acls", SupportPackage.deserialize_acls, ("/v1/redis_acls",)),
+        ("Permissions", SupportPackage.deserialize_permissions,
+         ("/v1/bdbs", "/v1/roles", "/v1/redis_acls")),
+        ("Databases", SupportPackage.deserialize_bdb_info, ("/v1/bdbs",)),
+    )
+
+    sheets = tuple(sheet for sheet, _builder, _inputs in plan)
+
+    # endpoints that tell whether a cluster changed since the last inventory
+    fingerprint_endpoints = ("/v1/license", "/v1/cluster", "/v1/bdbs", "/v1/nodes")
+
+    # sheets of an unchanged cluster taken from its last inventory, the
+    # other sheets are rebuilt from fresh responses
+    reusable = ("Shards",)
+
+    def __init__(self, workers=None):
+        """
+        Initialize the InventoryCollector class.
+
+        :param workers: Concurrent requests per cluster (default: the http pool size).
+        """
+        self.workers = workers if workers else HttpSessions.pool_size
+
+    @staticmethod
+    def fetch(fqdn, ip, username, password, endpoint):
+        """fetch an endpoint, keeping only the fields used by the inventory"""
+        response = SupportPackage.api_request(fqdn, ip, username, password, endpoint)
+        return JsonDecoder.decode(endpoint, response.content)
+
+    def fingerprint(self, fqdn, ip, username, password):
+        """
+        Fingerprint a cluster from its database change times, node software
+        versions, shard counts, license and cluster configuration. Responses
+        already fetched by collect are reused from the api cache.
+
+        :return: A hex digest.
+        """
+        with ThreadPoolExecutor(max_workers=self.workers,
+                                thread_name_prefix=fqdn) as executor:
+            responses = dict(zip(
+                InventoryCollector.fingerprint_endpoints,
+                executor.map(lambda endpoint: InventoryCollector.fetch(
+                    fqdn, ip, username, password, endpoint),
+                             InventoryCollector.fingerprint_endpoints)))
+
+        state = {
+            "license": responses["/v1/license"],
+            "cluster": responses["/v1/cluster"],
+            "bdbs": sorted((bdb["uid"], bdb["last_changed_time"], bdb["shards_count"])
+                           for bdb in responses["/v1/bdbs"]),
+            "nodes": sorted((node["uid"], node["software_version"], node["shard_count"])
+                            for node in responses["/v1/nodes"]),
+        }
+        return hashlib.sha256(
+            json.dumps(state, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def collect(self, fqdn, ip, username, password, reuse=None):
+        """
+        Collect the inventory of a cluster.
+
+        :param reuse: Rows of sheets to take as is (from a previous inventory),
+                      the endpoints only these sheets need are not fetched.
+        :return: A dictionary of sheet name to list of rows.
+        """
+        responses = {}
+        inventory = dict(reuse) if reuse else {}
+        pending = [step for step in InventoryCollector.plan if step[0] not in inventory]
+        needed = {endpoint for _sheet, _builder, inputs in pending for endpoint in inputs}
+
+        with ThreadPoolExecutor(max_workers=self.workers,
+                                thread_name_prefix=fqdn) as executor:
+            futures = {executor.submit(InventoryCollector.fetch, fqdn, ip, username,
+                                       password, endpoint): endpoint
+                       for endpoint in InventoryCollector.endpoints if endpoint in needed}
+            try:
+                while futures:
+                    done, _not_done = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        responses[futures.pop(future)] = future.result()
+
+                    # build the sheets whose inputs are all available
+                    waiting = []
+                    for sheet, builder, inputs in pending:
+                        if all(endpoint in responses for endpoint in inputs):
+                            inventory[sheet] = builder(
+                                fqdn, *(responses[endpoint] for endpoint in inputs))
+                        else:
+                            waiting.append((sheet, builder, inputs))
+                    pending = waiting
+            finally:
+                # a failed endpoint fails the cluster, do not wait for the others
+                for future in futures:
+                    future.cancel()
+
+        return inventory
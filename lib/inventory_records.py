@@ -0,0 +1,124 @@
+"""inventory records module"""
+from collections.abc import Mapping
+
+
+class Record(Mapping):
+    """
+    Base class of the inventory records.
+    A record is a slotted object holding one sheet row. It is a read-only
+    mapping of sheet column to value, so the report generator and the
+    inventory store handle records like the row dictionaries they replace,
+    at a fraction of the memory. Unset slots are left out of the row.
+    """
+    __slots__ = ()
+    # sheet column of each slot, in sheet order
+    columns = ()
+    slot_of = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.slot_of = dict(zip(cls.columns, cls.__slots__))
+
+    def __init__(self, **values):
+        for slot, value in values.items():
+            setattr(self, slot, value)
+
+    def __getitem__(self, column):
+        slot = self.slot_of.get(column)
+        if slot is None:
+            raise KeyError(column)
+        try:
+            return getattr(self, slot)
+        except AttributeError:
+            raise KeyError(column) from None
+
+    def __iter__(self):
+        for column, slot in self.slot_of.items():
+            if hasattr(self, slot):
+                yield column
+
+    def __len__(self):
+        return sum(1 for _column in self)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)})"
+
+
+class ClusterRecord(Record):
+    """Clusters sheet row"""
+    __slots__ = ("fqdn", "cluster_name", "license_owner", "version", "os", "rack_aware",
+                 "features", "activated", "expiration", "expired", "shard_limit",
+                 "ram_shards", "rof_shards", "nodes", "version_mismatch")
+    columns = ("fqdn", "cluster_name", "license_owner", "version", "os", "rack aware",
+               "features", "activated", "expiration", "expired", "shard_limit",
+               "ram_shards", "rof_shards", "nodes", "version_mismatch")
+
+
+class NodeRecord(Record):
+    """Nodes sheet row"""
+    __slots__ = ("fqdn", "uid", "status", "addr", "rack_id", "os_version", "architecture",
+                 "cores", "software_version", "shard_count", "shard_list", "memory")
+    columns = ("fqdn", "id", "status", "addr", "rack_id", "os_version", "architecture",
+               "cores", "software_version", "shard_count", "shard_list", "memory GiB")
+
+
+class ShardRecord(Record):
+    """Shards sheet row"""
+    __slots__ = ("fqdn", "bdb_uid", "node_uid", "bdb_name", "uid", "role", "slots")
+    columns = ("fqdn", "database id", "node id", "database name", "id", "role", "slots")
+
+
+class DatabaseRecord(Record):
+    """Databases sheet row"""
+    __slots__ = ("fqdn", "uid", "name", "version", "total_shards", "memory",
+                 "high_availability", "flex", "created", "modified", "persistence",
+                 "eviction_policy", "crdb", "modules", "tls", "authentication",
+                 "oss_cluster", "proxy_policy", "shard_placement", "external_endpoint",
+                 "internal_endpoint")
+    columns = ("fqdn", "Id", "Name", "Version", "Total Shards", "Memory GiB",
+               "High Availability", "Flex", "Created", "Modified", "Persistence",
+               "Eviction Policy", "CRDB", "Modules", "TLS", "Authentication",
+               "OSS Cluster API", "Proxy Policy", "Shard Placement", "External Endpoint",
+               "Internal Endpoint")
+
+
+class CertificateRecord(Record):
+    """Certificates sheet row"""
+    __slots__ = ("fqdn", "source", "cert", "expiration", "subject", "issuer")
+    columns = ("fqdn", "source", "cert", "expiration", "subject", "issuer")
+
+
+class CipherRecord(Record):
+    """Ciphers sheet row"""
+    __slots__ = ("fqdn", "type", "ciphers")
+    columns = ("fqdn", "type", "ciphers")
+
+
+class RoleRecord(Record):
+    """Roles sheet row"""
+    __slots__ = ("fqdn", "uid", "name", "management")
+    columns = ("fqdn", "uid", "name", "management")
+
+
+class AclRecord(Record):
+    """Acls sheet row"""
+    __slots__ = ("fqdn", "uid", "name", "acl")
+    columns = ("fqdn", "uid", "name", "acl")
+
+
+class PermissionRecord(Record):
+    """Permissions sheet row"""
+    __slots__ = ("fqdn", "bdb_uid", "bdb_name", "order", "role", "acl")
+    columns = ("fqdn", "Id", "Name", "Order", "Role", "Acl")
+
+
+def index_by_uid(items, field="name"):
+    """uid keyed index of a field of REST API objects, built once per cluster"""
+    return {item["uid"]: item[field] for item in items}
+
+
+def json_default(value):
+    """json encoding of inventory records (json.dumps default)"""
+    if isinstance(value, Mapping):
+        return dict(value)
+    return str(value)
@@ -0,0 +1,200 @@
+"""inventory store module"""
+import gzip
+import json
+import sqlite3
+from collections.abc import Mapping
+from datetime import datetime
+
+
+class InventoryStore:
+    """
+    Inventory Store Class.
+    Keeps every inventory snapshot in a SQLite database, one table per
+    inventory sheet. Every row carries the id of its snapshot so the
+    history of the fleet can be queried without polling the clusters.
+    """
+    db_file = "rflat.db"
+
+    tables = {
+        "Clusters": "clusters",
+        "Nodes": "nodes",
+        "Shards": "shards",
+        "Databases": "databases",
+        "Certificates": "certificates",
+        "Roles": "roles",
+        "Acls": "acls",
+        "Permissions": "permissions",
+        "Ciphers": "ciphers",
+    }
+
+    # indexed columns (when present) in addition to snapshot_id and fqdn
+    indexes = {
+        "clusters": ("expiration", "version"),
+        "shards": ("database id",),
+        "databases": ("Id",),
+        "certificates": ("expiration",),
+        "permissions": ("Id",),
+    }
+
+    def __init__(self, db_file=None, read_only=False):
+        """
+        Open (or create) the inventory database.
+
+        :param db_file: The SQLite database file.
+        :param read_only: Open an existing database for queries only.
+        """
+        self.db_file = db_file if db_file else InventoryStore.db_file
+        if read_only:
+            self.connection = sqlite3.connect(f"file:{self.db_file}?mode=ro", uri=True)
+        else:
+            self.connection = sqlite3.connect(self.db_file)
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots "
+                "(id INTEGER PRIMARY KEY AUTOINCREMENT, taken TEXT NOT NULL)")
+            # per cluster fingerprint and inventory of each snapshot, used by
+            # incremental runs to reuse the inventory of unchanged clusters
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS fingerprints "
+                "(snapshot_id INTEGER NOT NULL REFERENCES snapshots(id), "
+                "fqdn TEXT NOT NULL, fingerprint TEXT NOT NULL, inventory BLOB)")
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_fingerprints_fqdn "
+                "ON fingerprints (fqdn, snapshot_id)")
+        self.columns = {}
+
+    @staticmethod
+    def quote(identifier):
+        """quote a table or column name (inventory columns contain spaces)"""
+        return '"' + identifier.replace('"', '""') + '"'
+
+    def begin_snapshot(self):
+        """
+        Start a new snapshot.
+
+        :return: The snapshot id.
+        """
+        cursor = self.connection.execute(
+            "INSERT INTO snapshots (taken) VALUES (?)",
+            (datetime.now().strftime("%Y-%m-%d %H:%M:%S"),))
+        return cursor.lastrowid
+
+    def get_columns(self, table):
+        """existing columns of a table"""
+        if table not in self.columns:
+            rows = self.connection.execute(
+                f"PRAGMA table_info({InventoryStore.quote(table)})").fetchall()
+            self.columns[table] = [row[1] for row in rows]
+        return self.columns[table]
+
+    def ensure_table(self, table, keys):
+        """create the table of a sheet, or add the columns it does not have yet"""
+        columns = self.get_columns(table)
+        if not columns:
+            definitions = ", ".join(
+                ["snapshot_id INTEGER NOT NULL REFERENCES snapshots(id)"]
+                + [InventoryStore.quote(key) for key in keys])
+            self.connection.execute(
+                f"CREATE TABLE {InventoryStore.quote(table)} ({definitions})")
+            for column in ("snapshot_id", "fqdn") + InventoryStore.indexes.get(table, ()):
+                if column in keys or column == "snapshot_id":
+                    index = InventoryStore.quote(f"idx_{table}_{column.replace(' ', '_')}")
+                    self.connection.execute(
+                        f"CREATE INDEX {index} ON {InventoryStore.quote(table)} "
+                        f"({InventoryStore.quote(column)})")
+            self.columns[table] = ["snapshot_id"] + list(keys)
+            return
+
+        for key in keys:
+            if key not in columns:
+                self.connection.execute(
+                    f"ALTER TABLE {InventoryStore.quote(table)} "
+                    f"ADD COLUMN {InventoryStore.quote(key)}")
+                columns.append(key)
+
+    def add_rows(self, snapshot_id, sheet_name, rows):
+        """
+        Add the rows of an inventory sheet to a snapshot.
+
+        :param snapshot_id: The id returned by begin_snapshot.
+        :param sheet_name: The inventory sheet name.
+        :param rows: A list of dictionaries representing rows of data.
+        """
+        if not rows:
+            return
+        table = InventoryStore.tables[sheet_name]
+        keys = []
+        for row in rows:
+            keys.extend(key for key in row if key not in keys)
+        self.ensure_table(table, keys)
+
+        names = ", ".join(["snapshot_id"] + [InventoryStore.quote(key) for key in keys])
+        placeholders = ", ".join("?" * (len(keys) + 1))
+        self.connection.executemany(
+            f"INSERT INTO {InventoryStore.quote(table)} ({names}) VALUES ({placeholders})",
+            ([snapshot_id] + [InventoryStore.value(row.get(key)) for key in keys]
+             for row in rows))
+
+    @staticmethod
+    def value(value):
+        """convert a cell value to a SQLite value"""
+        if value is None or isinstance(value, (int, float, str)):
+            return value
+        return str(value)
+
+    @staticmethod
+    def encode(value):
+        """json encoding of inventory records"""
+        if isinstance(value, Mapping):
+            return dict(value)
+        return str(value)
+
+    def save_inventory(self, snapshot_id, fqdn, fingerprint, inventory):
+        """
+        Save the fingerprint and the inventory of a cluster.
+
+        :param inventory: A dictionary of sheet name to list of rows.
+        """
+        blob = gzip.compress(json.dumps(
+            inventory, default=InventoryStore.encode).encode("utf-8"))
+        self.connection.execute(
+            "INSERT INTO fingerprints (snapshot_id, fqdn, fingerprint, inventory) "
+            "VALUES (?, ?, ?, ?)", (snapshot_id, fqdn, fingerprint, blob))
+
+    def get_fingerprint(self, fqdn):
+        """
+        Get the latest fingerprint of a cluster.
+
+        :return: A tuple containing the snapshot id and the fingerprint, or None.
+        """
+        return self.connection.execute(
+            "SELECT snapshot_id, fingerprint FROM fingerprints WHERE fqdn = ? "
+            "ORDER BY snapshot_id DESC LIMIT 1", (fqdn,)).fetchone()
+
+    def load_inventory(self, snapshot_id, fqdn):
+        """
+        Load the inventory of a cluster saved with a snapshot.
+
+        :return: A dictionary of sheet name to list of rows.
+        """
+        row = self.connection.execute(
+            "SELECT inventory FROM fingerprints WHERE snapshot_id = ? AND fqdn = ?",
+            (snapshot_id, fqdn)).fetchone()
+        return json.loads(gzip.decompress(row[0])) if row else None
+
+    def commit(self):
+        """commit the snapshot"""
+        self.connection.commit()
+
+    def query(self, sql, parameters=()):
+        """
+        Run a query.
+
+        :return: A tuple containing the column names and the rows.
+        """
+        cursor = self.connection.execute(sql, parameters)
+        columns = [column[0] for column in cursor.description] if cursor.description else []
+        return columns, cursor.fetchall()
+
+    def close(self):
+        """close the database"""
+        self.connection.close()
@@ -0,0 +1,137 @@
+"""json decoder module"""
+import codecs
+import json
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class JsonDecoder:
+    """
+    Schema driven decoding of REST API responses.
+    List endpoints with a declared schema are parsed incrementally, one
+    array element at a time, and only the fields used by the inventory are
+    kept, so large shard and database lists are never materialised in
+    full. Other responses are decoded with orjson when it is installed.
+    """
+    schemas = {
+        "/v1/bdbs": (
+            "uid", "name", "version", "shards_count", "slave_ha", "memory_size",
+            "bigstore", "created_time", "last_changed_time", "data_persistence",
+            "eviction_policy", "crdt", "module_list", "tls_mode",
+            "authentication_redis_pass", "roles_permissions", "oss_cluster",
+            "proxy_policy", "shards_placement", "endpoints",
+            "authentication_ssl_client_certs"),
+        "/v1/nodes": (
+            "uid", "status", "addr", "rack_id", "os_version", "architecture", "cores",
+            "software_version", "shard_count", "shard_list", "total_memory"),
+        "/v1/shards": ("uid", "bdb_uid", "node_uid", "role", "assigned_slots"),
+        "/v1/roles": ("uid", "name", "management"),
+        "/v1/redis_acls": ("uid", "name", "acl"),
+    }
+
+    whitespace = re.compile(r"[ \t\n\r]*")
+    decoder = json.JSONDecoder()
+    # bytes of the response decoded to str at a time
+    window = 256 * 1024
+
+    @staticmethod
+    def loads(content):
+        """decode a complete json document from bytes or str"""
+        if orjson is not None:
+            return orjson.loads(content)
+        return json.loads(content)
+
+    @staticmethod
+    def iter_array(content):
+        """
+        Iterate over the elements of a top level json array.
+        The bytes are decoded to str one window at a time and the consumed
+        part of the window is dropped on refill, so the body is never copied
+        to a str as a whole.
+
+        :param content: The json document as bytes.
+        :return: A generator of decoded elements.
+        """
+        utf8 = codecs.getincrementaldecoder("utf-8")()
+        skip = JsonDecoder.whitespace.match
+        offset = 0
+        text = ""
+        position = 0
+
+        def refill(size):
+            """append the next bytes to the window, dropping the consumed part"""
+            nonlocal offset, text, position
+            chunk = content[offset:offset + size]
+            offset += len(chunk)
+            text = text[position:] + utf8.decode(chunk, final=offset >= len(content))
+            position = 0
+
+        def next_char():
+            """skip whitespace and peek at the next character"""
+            nonlocal position
+            while True:
+                position = skip(text, position).end()
+                if position < len(text) or offset >= len(content):
+                    return text[position:position + 1]
+                refill(JsonDecoder.window)
+
+        if next_char() != "[":
+            raise ValueError("Expecting a json array")
+        position += 1
+        if next_char() == "]":
+            return
+        size = JsonDecoder.window
+        while True:
+            try:
+                item, end = JsonDecoder.decoder.raw_decode(text, position)
+                # a number cut by the end of the window decodes too (12. or 1e),
+                # only a separator seen in the window closes the element
+                follow = skip(text, end).end()
+                complete = text[follow:follow + 1] in (",", "]") or offset >= len(content)
+            except ValueError:
+                if offset >= len(content):
+                    raise
+                complete = False
+            if not complete:
+                # the element continues in the next window
+                refill(size)
+                size *= 2
+                continue
+            size = JsonDecoder.window
+            yield item
+            position = end
+            separator = next_char()
+            if separator == "]":
+                position += 1
+                if next_char() != "":
+                    raise ValueError("Extra data after the json array")
+                return
+            if separator != ",":
+                raise ValueError("Expecting ',' or ']' between array elements")
+            position += 1
+            next_char()
+
+    @staticmethod
+    def project(item, fields):
+        """keep the schema fields of an element"""
+        return {field: item[field] for field in fields}
+
+    @staticmethod
+    def decode(endpoint, content):
+        """
+        Decode the response of an endpoint.
+
+        :param endpoint: The api path, used to select the schema.
+        :param content: The response body as bytes.
+        :return: The decoded (and projected) json.
+        """
+        fields = JsonDecoder.schemas.get(endpoint)
+        if fields is None:
+            return JsonDecoder.loads(content)
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        return [JsonDecoder.project(item, fields) for item in JsonDecoder.iter_array(content)]
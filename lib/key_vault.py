@@ -1,4 +1,6 @@
 """Keyring Module"""
+import atexit
+import threading
 import keyring
 from cryptography.fernet import Fernet
 
@@ -33,6 +35,7 @@ class KeyVault:
                 KeyVault.key_ring_service,
                 KeyVault.key_ring_username,
                 KeyVault.key)
+            VaultSession.close()
             return True
         else:
             return False
@@ -45,6 +48,7 @@ class KeyVault:
             KeyVault.key_ring_service,
             KeyVault.key_ring_username,
             keypass)
+        VaultSession.close()
 
     @staticmethod
     def get_key():
@@ -62,3 +66,33 @@ class KeyVault:
         keyring.delete_password(
             KeyVault.key_ring_service,
             KeyVault.key_ring_username)
+        VaultSession.close()
+
+
+class VaultSession:
+    """
+    Vault Session Class.
+    The master key is read from the keyring once per process and the
+    cipher built from it is shared by every encryption and decryption.
+    The session is closed at exit, dropping the cached key and cipher.
+    """
+    cipher = None
+    lock = threading.Lock()
+
+    @staticmethod
+    def get_cipher():
+        """get the session cipher, unlocking the master key on first use"""
+        with VaultSession.lock:
+            if VaultSession.cipher is None:
+                VaultSession.cipher = Fernet(KeyVault.get_key())
+            return VaultSession.cipher
+
+    @staticmethod
+    def close():
+        """drop the cached master key and cipher"""
+        with VaultSession.lock:
+            VaultSession.cipher = None
+            KeyVault.key = None
+
+
+atexit.register(VaultSession.close)
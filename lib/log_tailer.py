@@ -0,0 +1,128 @@
+"""log tailer module"""
+from collections import deque
+
+
+class LogTailer:
+    """
+    Keep the last lines of a log as raw bytes.
+    Logs are never decoded, so mixed or invalid encodings are tailed like
+    any other content.
+    """
+
+    def __init__(self, lines=500, block_size=64 * 1024):
+        """
+        Initialize the LogTailer class.
+
+        :param lines: Number of lines to keep.
+        :param block_size: Size of the blocks read from the log.
+        """
+        self.lines = lines
+        self.block_size = block_size
+
+    def tail(self, fileobj, size, seekable=False):
+        """
+        Get the last lines of a file object.
+
+        :param fileobj: A readable binary file object.
+        :param size: Size of the content in bytes.
+        :param seekable: Read backwards from the end (only when seeking is cheap).
+        :return: The last lines as bytes, line endings preserved.
+        """
+        if self.lines <= 0:
+            return b""
+        if seekable:
+            return self.tail_seek(fileobj, size)
+        return self.tail_stream(fileobj)
+
+    def tail_seek(self, fileobj, size, start=0):
+        """read blocks backwards from the end (down to start) until enough lines are found"""
+        blocks = []
+        newlines = 0
+        position = size
+        while position > start and newlines < self.lines:
+            read_size = min(self.block_size, position - start)
+            position -= read_size
+            fileobj.seek(position)
+            block = fileobj.read(read_size)
+            # a trailing newline ends the last line, it does not start one
+            last = len(block) - 1 if not blocks else len(block)
+            newlines += block.count(b"\n", 0, last)
+            blocks.append(block)
+
+        data = b"".join(reversed(blocks))
+        end = len(data) - 1 if data.endswith(b"\n") else len(data)
+        first = end
+        for _ in range(self.lines):
+            first = data.rfind(b"\n", 0, first)
+            if first < 0:
+                return data
+        return data[first + 1:]
+
+    def tail_stream(self, fileobj, prefix=b""):
+        """read forward keeping a bounded ring of the most recent lines"""
+        ring = deque(maxlen=self.lines)
+        lines = prefix.split(b"\n")
+        partial = lines.pop()
+        ring.extend(line + b"\n" for line in lines[-self.lines:])
+        while True:
+            block = fileobj.read(self.block_size)
+            if not block:
+                break
+            lines = (partial + block).split(b"\n")
+            partial = lines.pop()
+            ring.extend(line + b"\n" for line in lines[-self.lines:])
+        if partial:
+            ring.append(partial)
+        return b"".join(ring)
+
+    def head_tail(self, fileobj, size, head_lines, seekable=False):
+        """
+        Get the first head_lines lines and the last lines of a file object.
+
+        :return: The head followed by the tail, without overlap.
+        """
+        buffer = b""
+        newlines = 0
+        while newlines < head_lines:
+            block = fileobj.read(self.block_size)
+            if not block:
+                return buffer
+            newlines += block.count(b"\n")
+            buffer += block
+
+        cut = -1
+        for _ in range(head_lines):
+            cut = buffer.find(b"\n", cut + 1)
+        head, rest = buffer[:cut + 1], buffer[cut + 1:]
+        if self.lines <= 0:
+            return head
+        if seekable:
+            return head + self.tail_seek(fileobj, size, len(head))
+        return head + self.tail_stream(fileobj, rest)
+
+    def tail_bytes(self, fileobj, size, max_bytes, seekable=False):
+        """
+        Get at most the last max_bytes bytes of a file object, starting on
+        a line boundary when the kept data contains one.
+        """
+        if seekable:
+            fileobj.seek(max(0, size - max_bytes))
+            data = fileobj.read(max_bytes)
+        else:
+            blocks = deque()
+            kept = 0
+            while True:
+                block = fileobj.read(self.block_size)
+                if not block:
+                    break
+                blocks.append(block)
+                kept += len(block)
+                while blocks and kept - len(blocks[0]) >= max_bytes:
+                    kept -= len(blocks.popleft())
+            data = b"".join(blocks)[-max_bytes:] if max_bytes > 0 else b""
+
+        if len(data) < size:
+            newline = data.find(b"\n")
+            if 0 <= newline < len(data) - 1:
+                data = data[newline + 1:]
+        return data
@@ -0,0 +1,88 @@
+"""partial inventory module"""
+import gzip
+import json
+import os
+from datetime import datetime
+from .inventory_records import json_default
+
+
+class PartialInventory:
+    """
+    Partial Inventory Class.
+    Inventory collected by one runner of a sharded sweep, written as a
+    gzipped JSON lines file: a header line describing the shard, then one
+    line per cluster holding its inventory sheets. Partial inventories of
+    all the shards are merged into a single workbook by rflat merge.
+    """
+    format = "rflat-partial-inventory"
+
+    def __init__(self, fname, shard, pattern):
+        """
+        Start a partial inventory.
+
+        :param fname: The artifact file name.
+        :param shard: A tuple containing the shard index (1 based) and the shard count.
+        :param pattern: The fqdn pattern of the sweep.
+        """
+        self.fname = fname
+        self.part = fname + ".part"
+        self.file = gzip.open(self.part, "wt", encoding="utf-8")
+        self.write({"format": PartialInventory.format, "shard": list(shard),
+                    "pattern": pattern,
+                    "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+
+    @staticmethod
+    def get_fname(path, shard):
+        """format filename from timestamp and shard"""
+        formatted_time = datetime.now().strftime("%Y%m%d%H%M%S")
+        fname = f"partial_inventory_{shard[0]}of{shard[1]}_{formatted_time}.jsonl.gz"
+        if not os.path.exists(path):
+            os.makedirs(path)
+        return os.path.join(path, fname)
+
+    def write(self, entry):
+        """append a line"""
+        self.file.write(json.dumps(entry, default=json_default) + "\n")
+
+    def add(self, fqdn, inventory):
+        """
+        Add the inventory of a cluster.
+
+        :param inventory: A dictionary of sheet name to list of rows.
+        """
+        self.write({"fqdn": fqdn, "inventory": inventory})
+
+    def close(self):
+        """complete the artifact (it only appears under its name once complete)"""
+        self.file.close()
+        os.replace(self.part, self.fname)
+
+    def abort(self):
+        """discard an artifact that was not completed (no-op once closed)"""
+        if self.file.closed:
+            return
+        self.file.close()
+        if os.path.exists(self.part):
+            os.remove(self.part)
+
+    @staticmethod
+    def read(fname):
+        """
+        Read a partial inventory.
+
+        :return: A tuple containing the header and a generator of
+                 (fqdn, inventory) tuples.
+        """
+        file = gzip.open(fname, "rt", encoding="utf-8")
+        header = json.loads(file.readline())
+        if header.get("format") != PartialInventory.format:
+            file.close()
+            raise ValueError(f"{fname} is not a partial inventory")
+
+        def clusters():
+            with file:
+                for line in file:
+                    entry = json.loads(line)
+                    yield entry["fqdn"], entry["inventory"]
+
+        return header, clusters()
@@ -0,0 +1,212 @@
+"""reduction policy module"""
+import fnmatch
+import io
+import json
+import re
+import tempfile
+from .log_tailer import LogTailer
+
+
+class ReductionRule:
+    """Reduction Rule Class"""
+    actions = ("drop", "keep", "tail", "head_tail", "max_bytes", "grep", "nested")
+
+    def __init__(self, name, action, glob=None, regex=None, names=None,
+                 lines=500, head=0, max_bytes=0, patterns=None):
+        """
+        Initialize the ReductionRule class. A rule matches members by glob,
+        regex or exact names (a glob '*' also matches '/').
+
+        :param name: Rule name used in reports.
+        :param action: One of drop, keep, tail, head_tail, max_bytes, grep, nested.
+        :param lines: Lines kept by tail (and at the end by head_tail).
+        :param head: Lines kept at the start by head_tail.
+        :param max_bytes: Bytes kept at the end of the member by max_bytes.
+        :param patterns: Regular expressions of the lines kept by grep.
+        """
+        if action not in ReductionRule.actions:
+            raise ValueError(f"Invalid action '{action}' in rule '{name}'")
+        if glob is None and regex is None and names is None:
+            raise ValueError(f"Rule '{name}' needs a glob, regex or names")
+        if regex is not None and "(?P<" in regex:
+            # the rules are combined into one expression with a named group per rule
+            raise ValueError(f"Named groups are not supported in the regex of rule '{name}'")
+        self.name = name
+        self.action = action
+        self.glob = glob
+        self.regex = regex
+        self.names = set(names) if names else set()
+        self.lines = int(lines)
+        self.head = int(head)
+        self.max_bytes = int(max_bytes)
+        self.patterns = patterns if patterns else []
+        self.grep = None
+        if action == "grep":
+            if not self.patterns:
+                raise ValueError(f"Rule '{name}' needs patterns")
+            self.grep = re.compile(
+                "|".join(f"(?:{p})" for p in self.patterns).encode())
+
+    def expression(self):
+        """regular expression matching the member names of this rule"""
+        expressions = []
+        if self.glob is not None:
+            # fnmatch.translate returns (?s:...)\Z
+            expressions.append(fnmatch.translate(self.glob)[:-2])
+        if self.regex is not None:
+            expressions.append(f"(?:{self.regex})")
+        if self.names:
+            expressions.extend(re.escape(name) for name in self.names)
+        return "|".join(expressions)
+
+    @staticmethod
+    def from_dict(index, rule):
+        """build a rule from its policy file entry"""
+        return ReductionRule(
+            rule.get("name", f"rule {index}"), rule.get("action", "keep"),
+            glob=rule.get("glob"), regex=rule.get("regex"), names=rule.get("names"),
+            lines=rule.get("lines", 500), head=rule.get("head", 0),
+            max_bytes=rule.get("max_bytes", 0), patterns=rule.get("patterns"))
+
+
+class ReductionPolicy:
+    """
+    Reduction Policy Class.
+    Rules are evaluated in order and the first match wins. All rules are
+    compiled into a single regular expression so the cost of matching a
+    member does not grow with the number of rules.
+
+    Policy files are json:
+
+        {
+            "rules": [
+                {"glob": "*/core.*", "action": "drop"},
+                {"glob": "*event_log.log", "action": "head_tail", "head": 100, "lines": 2000},
+                {"regex": ".*/syslog.*", "action": "grep", "patterns": ["ERROR", "WARN"]},
+                {"glob": "*.json", "action": "max_bytes", "max_bytes": 1048576}
+            ],
+            "defaults": true
+        }
+
+    With "defaults" (the default), the built-in rules are evaluated after
+    the rules of the file. Members of nested .gz files are matched by their
+    name without .gz and are excluded when no rule other than the fallback
+    matches them.
+    """
+
+    def __init__(self, rules, fallback="keep"):
+        """
+        Initialize the ReductionPolicy class.
+
+        :param rules: An ordered list of ReductionRule.
+        :param fallback: Action of members matching no rule.
+        """
+        self.rules = rules
+        self.fallback = ReductionRule("default", fallback, glob="*")
+        self.matcher = re.compile("|".join(
+            f"(?P<rule_{index}>(?:{rule.expression()}))" for index, rule in enumerate(rules)))
+        # group number of each rule, in rule order
+        self.groups = [self.matcher.groupindex[f"rule_{index}"] for index in range(len(rules))]
+
+    @staticmethod
+    def default_rules(lines_to_tail=500, exclude_files=None, nested=False):
+        """built-in rules"""
+        rules = []
+        if exclude_files:
+            rules.append(ReductionRule("excluded files", "drop", names=exclude_files))
+        rules.append(ReductionRule("compressed files", "nested" if nested else "drop",
+                                   glob="*.gz"))
+        rules.append(ReductionRule("logs", "tail", glob="*.log", lines=lines_to_tail))
+        # rotated logs such as event_log.log.1 or event_log.log-20240101
+        rules.append(ReductionRule("rotated logs", "tail",
+                                   regex=r".*\.log[.-]\d[\w-]*", lines=lines_to_tail))
+        return rules
+
+    @staticmethod
+    def default(lines_to_tail=500, exclude_files=None, nested=False):
+        """policy reproducing the built-in reduction"""
+        return ReductionPolicy(ReductionPolicy.default_rules(
+            lines_to_tail, exclude_files, nested))
+
+    @staticmethod
+    def load(filename, lines_to_tail=500, exclude_files=None, nested=False):
+        """load a policy file"""
+        with open(filename, 'r', encoding='utf-8') as file:
+            policy = json.load(file)
+        rules = [ReductionRule.from_dict(index, rule)
+                 for index, rule in enumerate(policy.get("rules", []))]
+        if policy.get("defaults", True):
+            rules.extend(ReductionPolicy.default_rules(
+                lines_to_tail, exclude_files, nested))
+        return ReductionPolicy(rules, policy.get("fallback", "keep"))
+
+    def match(self, name):
+        """first rule matching a member name"""
+        found = self.matcher.fullmatch(name) if self.rules else None
+        if found is None:
+            return self.fallback
+        # the rule whose group took part in the match (lastgroup may name a
+        # group nested in the rule expression)
+        for rule, group in zip(self.rules, self.groups):
+            if found.start(group) != -1:
+                return rule
+        return self.fallback
+
+    @staticmethod
+    def apply(rule, file_obj, size, seekable=False, buffer_size=1024 * 1024):
+        """
+        Apply a rule to a member.
+
+        :param rule: The ReductionRule matching the member (not drop or nested).
+        :param file_obj: The member file object.
+        :param size: The size of the member.
+        :param seekable: The member can be read backwards cheaply.
+        :return: A tuple containing a file object with the new content and its size.
+        """
+        if rule.action == "keep":
+            return file_obj, size
+
+        if rule.action == "tail":
+            content = LogTailer(rule.lines).tail(file_obj, size, seekable)
+        elif rule.action == "head_tail":
+            content = LogTailer(rule.lines).head_tail(file_obj, size, rule.head, seekable)
+        elif rule.action == "max_bytes":
+            if size <= rule.max_bytes:
+                return file_obj, size
+            content = LogTailer().tail_bytes(file_obj, size, rule.max_bytes, seekable)
+        else:
+            return ReductionPolicy.grep(rule, file_obj, buffer_size)
+
+        return io.BytesIO(content), len(content)
+
+    @staticmethod
+    def grep(rule, file_obj, buffer_size):
+        """keep the lines matching the rule patterns, spooling large results to disk"""
+        output = tempfile.SpooledTemporaryFile(max_size=buffer_size)
+        partial = b""
+        while True:
+            block = file_obj.read(buffer_size)
+            lines = (partial + block).split(b"\n")
+            partial = lines.pop() if block else b""
+            for line in lines:
+                if line and rule.grep.search(line):
+                    output.write(line + b"\n")
+            if not block:
+                break
+        size = output.tell()
+        output.seek(0)
+        return output, size
+
+    @staticmethod
+    def format_report(stats):
+        """format per rule statistics as log lines"""
+        lines = []
+        for name, stat in sorted(stats.items(), key=lambda x: x[1]["original"] - x[1]["kept"],
+                                 reverse=True):
+            saved = stat["original"] - stat["kept"]
+            lines.append(
+                f"Rule ({name}): members={stat['members']} "
+                f"original={round(stat['original'] / 1_000_000, 2)}MB "
+                f"kept={round(stat['kept'] / 1_000_000, 2)}MB "
+                f"saved={round(saved / 1_000_000, 2)}MB")
+        return lines
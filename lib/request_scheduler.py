@@ -0,0 +1,181 @@
+"""request scheduler module"""
+import threading
+import time
+from contextlib import contextmanager
+
+
+class AdaptiveLimit:
+    """
+    Concurrency limit adjusted AIMD style: every successful request adds
+    1/limit (about one slot per round of requests), an error or a latency
+    spike halves it, at most once per decrease_interval.
+    """
+    decrease_interval = 1.0
+
+    def __init__(self, limit, maximum, minimum=1, adaptive=True):
+        """
+        :param limit: Initial limit.
+        :param maximum: Upper bound of the limit.
+        :param minimum: Lower bound of the limit.
+        :param adaptive: Adjust the limit from the outcome of the requests.
+        """
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.limit = float(min(max(limit, self.minimum), self.maximum))
+        self.adaptive = adaptive
+        self.inflight = 0
+        self.lowest = self.limit
+        self.decreases = 0
+        self.last_decrease = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """wait for a free slot"""
+        with self.condition:
+            while self.inflight >= int(self.limit):
+                self.condition.wait()
+            self.inflight += 1
+
+    def release(self, outcome=None):
+        """
+        Free a slot.
+
+        :param outcome: True (success), False (congestion) or None (no signal).
+        """
+        with self.condition:
+            self.inflight -= 1
+            if self.adaptive and outcome is True:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            elif self.adaptive and outcome is False:
+                now = time.monotonic()
+                if now - self.last_decrease >= AdaptiveLimit.decrease_interval:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self.lowest = min(self.lowest, self.limit)
+                    self.decreases += 1
+                    self.last_decrease = now
+            self.condition.notify_all()
+
+
+class RequestScheduler:
+    """
+    Request Scheduler Class.
+    Bounds the REST API requests of a fleet run: a global cap on concurrent
+    json requests, an adaptive per cluster cap so no cluster manager is
+    flooded, and a separate fleet wide cap on the heavy debuginfo requests
+    (one per cluster at a time). Slow responses and transient errors shrink
+    the cap of the cluster (or the heavy cap), successes grow it back.
+    """
+    global_limit = 32
+    cluster_limit = 8
+    cluster_start = 4
+    heavy_limit = 1
+    # a response slower than latency_factor times the fastest response of
+    # the same endpoint (and than latency_floor seconds) signals congestion
+    latency_factor = 3.0
+    latency_floor = 1.0
+
+    light = None
+    heavy = None
+    clusters = {}
+    cluster_heavy = {}
+    baselines = {}
+    lock = threading.Lock()
+
+    @staticmethod
+    def configure(global_limit=None, cluster_limit=None, heavy_limit=None):
+        """set the caps of the run (before the first request)"""
+        if global_limit:
+            RequestScheduler.global_limit = max(1, int(global_limit))
+        if cluster_limit:
+            RequestScheduler.cluster_limit = max(1, int(cluster_limit))
+            RequestScheduler.cluster_start = min(RequestScheduler.cluster_start,
+                                                 RequestScheduler.cluster_limit)
+        if heavy_limit:
+            RequestScheduler.heavy_limit = max(1, int(heavy_limit))
+        with RequestScheduler.lock:
+            RequestScheduler.light = None
+            RequestScheduler.heavy = None
+            RequestScheduler.clusters = {}
+            RequestScheduler.cluster_heavy = {}
+            RequestScheduler.baselines = {}
+
+    @staticmethod
+    def get_limits(fqdn, heavy):
+        """fleet and cluster limits of a request (created on first use)"""
+        with RequestScheduler.lock:
+            if heavy:
+                if RequestScheduler.heavy is None:
+                    RequestScheduler.heavy = AdaptiveLimit(
+                        RequestScheduler.heavy_limit, RequestScheduler.heavy_limit)
+                cluster = RequestScheduler.cluster_heavy.get(fqdn)
+                if cluster is None:
+                    cluster = AdaptiveLimit(1, 1, adaptive=False)
+                    RequestScheduler.cluster_heavy[fqdn] = cluster
+                return RequestScheduler.heavy, cluster
+            if RequestScheduler.light is None:
+                RequestScheduler.light = AdaptiveLimit(
+                    RequestScheduler.global_limit, RequestScheduler.global_limit,
+                    adaptive=False)
+            cluster = RequestScheduler.clusters.get(fqdn)
+            if cluster is None:
+                cluster = AdaptiveLimit(RequestScheduler.cluster_start,
+                                        RequestScheduler.cluster_limit)
+                RequestScheduler.clusters[fqdn] = cluster
+            return RequestScheduler.light, cluster
+
+    @staticmethod
+    def is_slow(fqdn, endpoint, elapsed):
+        """compare a response time with the fastest one of the endpoint"""
+        key = (fqdn, endpoint)
+        with RequestScheduler.lock:
+            baseline = RequestScheduler.baselines.get(key)
+            if baseline is None or elapsed < baseline:
+                RequestScheduler.baselines[key] = elapsed
+                return False
+        return (elapsed > RequestScheduler.latency_floor
+                and elapsed > baseline * RequestScheduler.latency_factor)
+
+    @staticmethod
+    @contextmanager
+    def slot(fqdn, endpoint, heavy=False):
+        """
+        Hold a request slot of a cluster for the duration of the block.
+        An exception leaving the block counts as congestion unless it has a
+        false retryable attribute (an authentication error for instance).
+
+        :param fqdn: The cluster fqdn.
+        :param endpoint: The api path, used for the latency baseline.
+        :param heavy: The request is a debuginfo download.
+        """
+        fleet, cluster = RequestScheduler.get_limits(fqdn, heavy)
+        # the cluster slot first, a throttled cluster does not hold fleet slots
+        cluster.acquire()
+        fleet.acquire()
+        start = time.perf_counter()
+        outcome = None
+        try:
+            yield
+            elapsed = time.perf_counter() - start
+            # debuginfo durations depend on the package size, only errors count
+            outcome = heavy or not RequestScheduler.is_slow(fqdn, endpoint, elapsed)
+        except Exception as e:
+            outcome = None if getattr(e, "retryable", True) is False else False
+            raise
+        finally:
+            fleet.release(outcome)
+            cluster.release(outcome)
+
+    @staticmethod
+    def report():
+        """per cluster limits of the run, most throttled first"""
+        with RequestScheduler.lock:
+            clusters = list(RequestScheduler.clusters.items())
+            heavy = RequestScheduler.heavy
+        report = [{"cluster": fqdn, "limit": round(limit.limit, 1),
+                   "lowest": round(limit.lowest, 1), "decreases": limit.decreases}
+                  for fqdn, limit in clusters]
+        report.sort(key=lambda x: (x["lowest"], -x["decreases"]))
+        if heavy is not None:
+            report.append({"cluster": "debuginfo (fleet)", "limit": round(heavy.limit, 1),
+                           "lowest": round(heavy.lowest, 1), "decreases": heavy.decreases})
+        return report
@@ -0,0 +1,119 @@
+"""resilience module"""
+import random
+import threading
+import time
+import requests
+
+
+class ApiError(requests.exceptions.RequestException):
+    """
+    Structured REST API failure.
+    kind is one of connect, timeout, request, http, circuit_open or offline;
+    status
+    is the HTTP status code when the cluster answered.
+    """
+
+    def __init__(self, fqdn, endpoint, kind, message, status=None, url=None, attempts=0,
+                 retry_after=None):
+        super().__init__(f"{kind}:{status if status else '-'}:{fqdn}:{endpoint}:{message}")
+        self.fqdn = fqdn
+        self.endpoint = endpoint
+        self.kind = kind
+        self.status = status
+        self.url = url
+        self.attempts = attempts
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self):
+        """transient failure worth another attempt"""
+        if self.kind in ("connect", "timeout"):
+            return True
+        return self.kind == "http" and self.status in RetryPolicy.retry_statuses
+
+    def to_dict(self):
+        """json friendly representation"""
+        return {"fqdn": self.fqdn, "endpoint": self.endpoint, "kind": self.kind,
+                "status": self.status, "url": self.url, "attempts": self.attempts,
+                "message": str(self)}
+
+
+class RetryPolicy:
+    """Jittered exponential backoff for idempotent GETs"""
+    attempts = 3
+    base_delay = 0.5
+    max_delay = 8.0
+    retry_statuses = (429, 502, 503, 504)
+
+    @staticmethod
+    def configure(attempts=None, base_delay=None, max_delay=None):
+        """override the retry settings for the run"""
+        if attempts is not None:
+            RetryPolicy.attempts = max(1, int(attempts))
+        if base_delay is not None:
+            RetryPolicy.base_delay = base_delay
+        if max_delay is not None:
+            RetryPolicy.max_delay = max_delay
+
+    @staticmethod
+    def delay(attempt, retry_after=None):
+        """
+        Backoff before the next attempt ("full jitter").
+
+        :param attempt: The number of the attempt that failed (1 based).
+        :param retry_after: Retry-After header of the response, if any.
+        :return: The delay in seconds.
+        """
+        ceiling = min(RetryPolicy.max_delay, RetryPolicy.base_delay * 2 ** (attempt - 1))
+        if retry_after:
+            try:
+                return min(RetryPolicy.max_delay, float(retry_after))
+            except ValueError:
+                pass
+        return random.uniform(0, ceiling)
+
+
+class CircuitBreaker:
+    """
+    Per cluster circuit breaker.
+    After threshold consecutive failed attempts the circuit of a cluster
+    opens and its requests fail immediately for cooldown seconds, so a
+    dead cluster is abandoned after a few timeouts instead of one per
+    request. The first failure after the cooldown opens it again, the
+    first success closes it.
+    """
+    threshold = 5
+    cooldown = 60
+
+    failures = {}
+    opened = {}
+    lock = threading.Lock()
+
+    @staticmethod
+    def allow(fqdn):
+        """check that requests to a cluster may be attempted"""
+        with CircuitBreaker.lock:
+            opened = CircuitBreaker.opened.get(fqdn)
+            return opened is None or time.monotonic() - opened >= CircuitBreaker.cooldown
+
+    @staticmethod
+    def success(fqdn):
+        """record a successful request"""
+        with CircuitBreaker.lock:
+            CircuitBreaker.failures.pop(fqdn, None)
+            CircuitBreaker.opened.pop(fqdn, None)
+
+    @staticmethod
+    def failure(fqdn):
+        """
+        Record a failed attempt.
+
+        :return: True if the circuit of the cluster is open.
+        """
+        with CircuitBreaker.lock:
+            failures = CircuitBreaker.failures.get(fqdn, 0) + 1
+            CircuitBreaker.failures[fqdn] = failures
+            if failures >= CircuitBreaker.threshold:
+                CircuitBreaker.opened[fqdn] = time.monotonic()
+                return True
+            return False
@@ -1,11 +1,29 @@
 """resolver module"""
 import os
 import json
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 class Resolver:
-    """resolver class"""
+    """
+    resolver class
+    resolver.json maps a cluster fqdn to one address, to a list of node
+    addresses, or (for clusters without configured addresses) to cached
+    DNS results {"dns": [...], "expires": epoch}. Before a fleet run the
+    addresses of every cluster are probed concurrently and requests are
+    routed to the fastest healthy one first.
+    """
+    port = 9443
+    probe_timeout = 3
+    probe_workers = 32
+    dns_ttl = 3600
+
     def __init__(self):
         self.resolver = {}
+        # probed addresses of each cluster, fastest healthy first
+        self.routes = {}
+        self.dirty = False
 
     def save_host(self, fqdn, ip):
         """update host"""
@@ -13,12 +31,34 @@ class Resolver:
             raise ValueError("Both fqdn and ip must be strings.")
         fqdn = fqdn.strip().lower()
         self.resolver[fqdn] = ip
+        self.dirty = True
+
+    def add_hosts(self, fqdn, addresses):
+        """
+        Add node addresses to a cluster, keeping the existing ones first.
+
+        :return: The number of new addresses.
+        """
+        fqdn = fqdn.strip().lower()
+        hosts = self.get_hosts(fqdn)
+        new = [address for address in dict.fromkeys(addresses)
+               if address and address not in hosts]
+        if new:
+            self.resolver[fqdn] = hosts + new
+            self.routes.pop(fqdn, None)
+            self.dirty = True
+        return len(new)
+
+    def learn_nodes(self, fqdn, nodes_json):
+        """add the addr of every node of a /v1/nodes response to a cluster"""
+        return self.add_hosts(fqdn, [node.get("addr") for node in nodes_json])
 
     def persist(self, filename='resolver.json'):
         """persist file"""
         try:
             with open(filename, 'w',encoding='utf-8') as file:
                 json.dump(self.resolver, file, indent=4)
+            self.dirty = False
             #print(f"Resolver dictionary has been saved to {filename}.")
         except Exception as e:
             print(f"An error occurred while saving: {e}")
@@ -38,7 +78,112 @@ class Resolver:
         except Exception as e:
             print(f"An error occurred while loading: {e}")
 
+    def get_hosts(self, fqdn):
+        """configured addresses of a cluster"""
+        entry = self.resolver.get(fqdn.strip().lower())
+        if isinstance(entry, str):
+            return [entry]
+        if isinstance(entry, list):
+            return list(entry)
+        return []
+
+    def cached_dns(self, fqdn):
+        """
+        Addresses of a cluster from the DNS cache of resolver.json.
+
+        :return: The cached addresses, or None if there is no fresh entry.
+        """
+        entry = self.resolver.get(fqdn.strip().lower())
+        if isinstance(entry, dict) and entry.get("expires", 0) > time.time():
+            return list(entry.get("dns", []))
+        return None
+
+    @staticmethod
+    def lookup(fqdn):
+        """
+        DNS lookup of a cluster (safe to run on a worker thread).
+
+        :return: The addresses of the fqdn, or None if the lookup failed.
+        """
+        try:
+            infos = socket.getaddrinfo(fqdn, Resolver.port, type=socket.SOCK_STREAM)
+        except OSError:
+            return None
+        return list(dict.fromkeys(info[4][0] for info in infos))
+
+    def cache_dns(self, fqdn, addresses):
+        """cache the addresses of a DNS lookup for dns_ttl"""
+        self.resolver[fqdn.strip().lower()] = {
+            "dns": addresses, "expires": int(time.time() + Resolver.dns_ttl)}
+        self.dirty = True
+
+    @staticmethod
+    def probe_address(address):
+        """
+        TCP connect time to the REST API port of an address.
+
+        :return: The connect time in seconds, or None if unreachable.
+        """
+        start = time.perf_counter()
+        try:
+            with socket.create_connection((address, Resolver.port),
+                                          timeout=Resolver.probe_timeout):
+                return time.perf_counter() - start
+        except OSError:
+            return None
+
+    def probe(self, fqdns):
+        """
+        Probe the addresses of several clusters concurrently and route the
+        requests of each cluster to its fastest healthy address first.
+        Unreachable addresses are kept last so requests can still fail over.
+
+        :param fqdns: List of cluster fqdns.
+        :return: A dictionary of fqdn to a list of (address, connect time or None).
+        """
+        targets = {}
+        lookups = []
+        for fqdn in fqdns:
+            hosts = self.get_hosts(fqdn) or self.cached_dns(fqdn)
+            if hosts:
+                targets[fqdn] = hosts
+            else:
+                lookups.append(fqdn)
+        with ThreadPoolExecutor(max_workers=Resolver.probe_workers) as executor:
+            # DNS lookups run on the pool, the cache is updated on this thread
+            for fqdn, addresses in zip(lookups, executor.map(Resolver.lookup, lookups)):
+                if addresses:
+                    self.cache_dns(fqdn, addresses)
+                # the fqdn itself stays the last resort when DNS fails
+                targets[fqdn] = addresses or [fqdn]
+            addresses = list(dict.fromkeys(
+                address for hosts in targets.values() for address in hosts))
+            timings = dict(zip(addresses, executor.map(Resolver.probe_address, addresses)))
+
+        report = {}
+        for fqdn, hosts in targets.items():
+            results = [(address, timings[address]) for address in hosts]
+            healthy = sorted((result for result in results if result[1] is not None),
+                             key=lambda result: result[1])
+            report[fqdn] = healthy + [result for result in results if result[1] is None]
+            self.routes[fqdn.strip().lower()] = [address for address, _ in report[fqdn]]
+        return report
+
     def get(self, fqdn):
-        """resolve fqdn"""
+        """
+        resolve fqdn
+
+        :return: The probed addresses of the cluster (a list), its configured
+                 address(es), or None to use the fqdn.
+        """
         fqdn = fqdn.strip().lower()
-        return self.resolver.get(fqdn, None)
+        if fqdn in self.routes:
+            return self.routes[fqdn]
+        hosts = self.get_hosts(fqdn)
+        if not hosts:
+            return None
+        if len(hosts) == 1:
+            return hosts[0]
+        # shared by the requests of the cluster so a failover sticks
+        self.routes[fqdn] = hosts
+        return hosts
@@ -0,0 +1,135 @@
+"""run journal module"""
+import json
+import os
+import threading
+from datetime import datetime
+from .inventory_records import json_default
+
+
+class RunJournal:
+    """
+    Run Journal Class.
+    Records the outcome of every cluster of a fleet sweep (and the inventory
+    collected for it) in a JSON lines file as soon as the cluster finishes.
+    A sweep that is interrupted can be resumed: completed clusters are
+    skipped and their data is read back from the journal. A partially
+    written last line (a crash while appending) is ignored.
+    """
+
+    def __init__(self, path, mode, pattern):
+        """
+        Initialize the RunJournal class.
+
+        :param path: Output folder of the sweep, the journal is kept there.
+        :param mode: The kind of sweep (xls or packages).
+        :param pattern: The fqdn pattern of the sweep.
+        """
+        if not os.path.exists(path):
+            os.makedirs(path)
+        self.fname = os.path.join(path, f".rflat_journal_{mode}.jsonl")
+        self.header = {"mode": mode, "pattern": pattern}
+        self.entries = {}
+        self.file = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        """
+        Read the journal of a previous run of the same sweep.
+
+        :return: False if there is no journal for this sweep.
+        """
+        if not os.path.isfile(self.fname):
+            return False
+        entries = {}
+        with open(self.fname, "r", encoding="utf-8") as file:
+            try:
+                header = json.loads(file.readline())
+            except ValueError:
+                return False
+            if any(header.get(key) != value for key, value in self.header.items()):
+                return False
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # interrupted while the entry was written
+                    break
+                entries[entry["fqdn"]] = entry
+        self.entries = entries
+        return True
+
+    def open(self, resume=False):
+        """
+        Start the journal, or continue the previous one when resuming.
+
+        :return: The number of clusters completed by the previous run.
+        """
+        if resume and self.load():
+            # drop a torn last line before appending
+            self.rewrite()
+            return len(self.completed_fqdns())
+        self.entries = {}
+        self.file = open(self.fname, "w", encoding="utf-8")
+        header = dict(self.header, started=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        self.write(header)
+        return 0
+
+    def rewrite(self):
+        """rewrite the journal from the loaded entries"""
+        part = self.fname + ".part"
+        with open(self.fname, "r", encoding="utf-8") as file:
+            header = file.readline()
+        with open(part, "w", encoding="utf-8") as file:
+            file.write(header)
+            for entry in self.entries.values():
+                file.write(json.dumps(entry, default=json_default) + "\n")
+        os.replace(part, self.fname)
+        self.file = open(self.fname, "a", encoding="utf-8")
+
+    def write(self, entry):
+        """append an entry and make it durable"""
+        self.file.write(json.dumps(entry, default=json_default) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def completed(self, fqdn):
+        """the entry of a completed cluster, or None"""
+        entry = self.entries.get(fqdn)
+        return entry if entry is not None and entry["status"] == "done" else None
+
+    def completed_fqdns(self):
+        """clusters completed by a previous run"""
+        return [fqdn for fqdn, entry in self.entries.items() if entry["status"] == "done"]
+
+    def failed_fqdns(self):
+        """clusters that failed"""
+        return [fqdn for fqdn, entry in self.entries.items() if entry["status"] == "failed"]
+
+    def is_complete(self, fqdns):
+        """every cluster of the sweep completed"""
+        return all(self.completed(fqdn) is not None for fqdn in fqdns)
+
+    def record(self, fqdn, status, **data):
+        """
+        Record the outcome of a cluster.
+
+        :param status: done or failed.
+        :param data: Data needed to rebuild the output of the cluster.
+        """
+        entry = dict(data, fqdn=fqdn, status=status)
+        with self.lock:
+            self.write(entry)
+            # the collected data lives on disk only
+            self.entries[fqdn] = {"fqdn": fqdn, "status": status}
+
+    def close(self, remove=False):
+        """
+        Close the journal.
+
+        :param remove: Delete the journal (the sweep is complete).
+        """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if remove and os.path.exists(self.fname):
+            os.remove(self.fname)
@@ -1,15 +1,44 @@
 """redis api module"""
 import os
 import json
+from operator import attrgetter
+import time
 from datetime import datetime
 import requests
+import urllib3
 from .tar_processor import TarProcessor
+from .compressors import Compressors
+from .reduction_policy import ReductionPolicy
 from .files_uploader import FilesUploader
 from .certificate_inspector import CertificateInspector
+from .http_session import HttpSessions
+from .api_cache import ApiCache, CachedResponse
+from .resilience import ApiError, RetryPolicy, CircuitBreaker
+from .request_scheduler import RequestScheduler
+from .inventory_records import (
+    ClusterRecord, NodeRecord, ShardRecord, DatabaseRecord, CertificateRecord,
+    CipherRecord, RoleRecord, AclRecord, PermissionRecord, index_by_uid)
 
 
 class SupportPackage:
     """Redis API Class"""
+    # attempts of a support package download, interrupted transfers included
+    download_attempts = 5
+    # seconds between two download progress messages
+    progress_interval = 10
+    # bytes read from the network at a time, at most this much is lost
+    # when a download is interrupted
+    chunk_size = 64 * 1024
+    # cluster cipher settings reported in the Ciphers sheet
+    cipher_settings = (
+        ('control_cipher_suites', 'control plane'),
+        ('control_cipher_suites_tls_1_3', 'control plane TLS 1.3'),
+        ('data_cipher_list', 'data plane ciphers'),
+        ('data_cipher_suites_tls_1_3', 'data plane ciphers TLS 1.3'),
+        ('sentinel_cipher_suites', 'sentinel ciphers'),
+        ('sentinel_cipher_suites_tls_1_3', 'sentinel ciphers TLS 1.3'),
+    )
+
     @staticmethod
     def convert_zulu_string(date_string):
         """convert Zulu String"""
@@ -18,35 +47,116 @@ class SupportPackage:
         return formatted_date
 
     @staticmethod
-    def get_fname(fqdn, path):
+    def get_fname(fqdn, path, suffix=".tar.gz"):
         """format file name"""
         current_time = datetime.now()
         formatted_time = current_time.strftime("%Y%m%d%H%M%S")
-        fname = f"debuginfo.{fqdn}_{formatted_time}.tar.gz"
+        fname = f"debuginfo.{fqdn}_{formatted_time}{suffix}"
         if not os.path.exists(path):
             os.makedirs(path)
         return os.path.join(path, fname)
 
     @staticmethod
-    def api_request(fqdn, ip, username, password,api_path):     
-        response = None  
-        host = fqdn if (ip is None) else ip
-        url = "https://" + host + ":9443" + api_path
-        try:
-            requests.packages.urllib3.disable_warnings()
-            response = requests.get(
-                url,
-                auth=(
-                    username,
-                    password),
-                verify=False,
-                timeout=500)
-            response.raise_for_status()          
+    def request_hosts(fqdn, hosts, username, password, api_path, stream, headers=None):
+        """
+        GET an api path from the first address of a cluster that accepts
+        the connection. The address that answered is moved to the front of
+        hosts so the next requests of the cluster go to it directly.
+
+        :raises ApiError: When the request failed.
+        """
+        error = None
+        for host in list(hosts):
+            url = "https://" + host + ":9443" + api_path
+            try:
+                response = HttpSessions.get(host, username, password, url, api_path,
+                                            stream=stream, headers=headers)
+            except requests.exceptions.ConnectionError as e:
+                # fail over to the next address of the cluster
+                print(f"Error:connect:{fqdn}:{url}:{e}")
+                error = ApiError(fqdn, api_path, "connect", str(e), url=url)
+                continue
+            except requests.exceptions.Timeout as e:
+                raise ApiError(fqdn, api_path, "timeout", str(e), url=url) from e
+            except requests.exceptions.RequestException as e:
+                raise ApiError(fqdn, api_path, "request", str(e), url=url) from e
+            if host != hosts[0]:
+                hosts[:] = [host] + [other for other in hosts if other != host]
+            if response.status_code >= 400:
+                response.close()
+                message = ("Invalid Credentials" if response.status_code in (401, 403)
+                           else response.reason)
+                raise ApiError(fqdn, api_path, "http", message, status=response.status_code,
+                               url=url, retry_after=response.headers.get("Retry-After"))
+            return response
+        raise error
+
+    @staticmethod
+    def api_request(fqdn, ip, username, password,api_path, stream=False, headers=None):     
+        """
+        GET a REST API path of a cluster.
+        Connection errors, timeouts and 429/502/503/504 answers are retried
+        with jittered exponential backoff. Every failed attempt counts
+        against the circuit breaker of the cluster, which fails the
+        remaining requests of a dead cluster immediately. Timeouts of
+        streamed requests are not retried (see spool_package).
+
+        :param ip: An address, or the addresses of the cluster nodes in the
+                   order they should be tried (see Resolver.get).
+        :param headers: Additional request headers of streamed requests.
+        :return: The response.
+        :raises ApiError: When the request failed.
+        """
+        if not stream:
+            # json responses are served from the api cache when possible
+            content = ApiCache.get(fqdn, api_path)
+            if content is not None:
+                return CachedResponse(content)
+            if ApiCache.offline:
+                raise ApiError(fqdn, api_path, "offline", "Not in cache")
+        if ip is None:
+            hosts = [fqdn]
+        else:
+            hosts = [ip] if isinstance(ip, str) else ip
+
+        attempt = 0
+        while True:
+            attempt += 1
+            if not CircuitBreaker.allow(fqdn):
+                raise ApiError(fqdn, api_path, "circuit_open",
+                               "Cluster abandoned after repeated failures",
+                               attempts=attempt - 1)
+            try:
+                if stream:
+                    # streamed debuginfo downloads hold a heavy slot (download_package)
+                    response = SupportPackage.request_hosts(
+                        fqdn, hosts, username, password, api_path, stream, headers)
+                else:
+                    with RequestScheduler.slot(fqdn, api_path):
+                        response = SupportPackage.request_hosts(
+                            fqdn, hosts, username, password, api_path, stream)
+            except ApiError as e:
+                e.attempts = attempt
+                if not e.retryable:
+                    # the cluster answered, it is not down
+                    if e.status is not None:
+                        CircuitBreaker.success(fqdn)
+                    raise
+                if CircuitBreaker.failure(fqdn) or attempt >= RetryPolicy.attempts:
+                    raise
+                if stream and e.kind == "timeout":
+                    # a debuginfo collection that timed out is not repeated here,
+                    # download retries belong to spool_package
+                    raise
+                delay = RetryPolicy.delay(attempt, e.retry_after)
+                print(f"Retry:{fqdn}:{api_path}:attempt {attempt} failed ({e.kind}"
+                      f"{':' + str(e.status) if e.status else ''}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            CircuitBreaker.success(fqdn)
+            if not stream:
+                ApiCache.put(fqdn, api_path, response.content)
             return response
-        except requests.exceptions.RequestException as e:
-            print(f"Error:{response.status_code}:{fqdn}:{url}:{e}")
-        except requests.exceptions.HTTPError as e:
-                print(f"Error:{response.status_code}:{fqdn}:{url}:Invalid Credentials")
 
     @staticmethod
     def get_authenciation_scheme(bdb):
@@ -61,14 +171,18 @@ class SupportPackage:
     def summarize_node_info(fqdn, ip, username, password):
         """summarize node info"""
         response = SupportPackage.api_request(fqdn,ip,username,password,"/v1/nodes")
+        return SupportPackage.summarize_nodes(json.loads(response.text))
+
+    @staticmethod
+    def summarize_nodes(nodes_json):
+        """summarize node info from the /v1/nodes json"""
         node_info = {}
         version_mismatch = False
         os_mismatch = False
         node_count = 0
         version = ''
         os_version = ''
-        
-        nodes_json = json.loads(response.text)
+
         for node in nodes_json:
             if node_count == 0:
                 version = node['software_version']
@@ -88,31 +202,55 @@ class SupportPackage:
             os_mismatch | version_mismatch) else False
         return node_info
 
+    @staticmethod
+    def summarize_cluster(fqdn, redis_license, cluster_json, nodes_json):
+        """cluster sheet row from the /v1/license, /v1/cluster and /v1/nodes json"""
+        nodeinfo = SupportPackage.summarize_nodes(nodes_json)
+
+        return [ClusterRecord(
+            fqdn=fqdn,
+            cluster_name=redis_license['cluster_name'],
+            license_owner=redis_license['owner'],
+            version=nodeinfo["version"],
+            os=nodeinfo["os"],
+            rack_aware=cluster_json["rack_aware"],
+            features="".join(feature + " " for feature in redis_license["features"]),
+            activated=SupportPackage.convert_zulu_string(redis_license["activation_date"]),
+            expiration=SupportPackage.convert_zulu_string(redis_license["expiration_date"]),
+            expired=redis_license["expired"],
+            shard_limit=redis_license["shards_limit"],
+            ram_shards=redis_license["ram_shards_in_use"],
+            rof_shards=redis_license["flash_shards_in_use"],
+            nodes=nodeinfo["nodes"],
+            version_mismatch=nodeinfo["mismatch"],
+        )]
+
     @staticmethod
     def get_nodes(fqdn,ip,username,password):
         response = SupportPackage.api_request(fqdn,ip,username,password,"/v1/nodes")        
-        data = json.loads(response.text)        
+        return SupportPackage.deserialize_nodes(fqdn, json.loads(response.text))
+
+    @staticmethod
+    def deserialize_nodes(fqdn, data):
+        """deserialize the /v1/nodes json"""
         nodes = []
         
         for item in data:
-            node={}
             #"accept_servers": true,
-            node["fqdn"] = fqdn
-            node["id"] = item["uid"]
-            node["status"] = item["status"]
-            node["addr"] = item["addr"]
-            node["rack_id"] = item["rack_id"] 
-            node["os_version"] = item["os_version"] 
-            node["architecture"] = item["architecture"]
-            node["cores"]= item["cores"]
-            node["software_version"] = item["software_version"]
-            node["shard_count"] = item["shard_count"]
-            node["shard_list"] = ''
-            for shard in item["shard_list"]:
-                node["shard_list"] += str(shard) + ','
-            node["shard_list"] =  node["shard_list"][:-1]        
-            node["memory GiB"] = round((item["total_memory"]/(1024**3)),2)
-            nodes.append(node)
+            nodes.append(NodeRecord(
+                fqdn=fqdn,
+                uid=item["uid"],
+                status=item["status"],
+                addr=item["addr"],
+                rack_id=item["rack_id"],
+                os_version=item["os_version"],
+                architecture=item["architecture"],
+                cores=item["cores"],
+                software_version=item["software_version"],
+                shard_count=item["shard_count"],
+                shard_list=",".join(str(shard) for shard in item["shard_list"]),
+                memory=round((item["total_memory"]/(1024**3)),2),
+            ))
 
         return nodes
 
@@ -145,42 +283,36 @@ class SupportPackage:
         bdbs = []
 
         for bdb in bdb_json:
-            rec = {}
-            rec['fqdn'] = fqdn
-            rec['Id'] = bdb['uid']
-            rec['Name'] = bdb['name']
-            rec['Version'] = bdb['version']
-            rec['Total Shards'] = bdb['shards_count'] if not bdb['slave_ha'] else bdb['shards_count'] * 2
-            rec['Memory GiB']=round((bdb['memory_size']/ (1024 ** 3)),2)
-            rec['High Availability'] = bdb['slave_ha']
-            rec['Flex'] = bdb['bigstore']
-            rec['Created'] = SupportPackage.convert_zulu_string(
-                bdb['created_time'])
-            rec['Modified'] = SupportPackage.convert_zulu_string(
-                bdb['last_changed_time'])
-            rec['Persistence'] = bdb['data_persistence']
-            rec['Eviction Policy'] = bdb['eviction_policy']
-            rec['CRDB'] = bdb['crdt']
-            rec['Modules'] = ''
-            for module in bdb['module_list']:
-                # print(module)
-                rec['Modules'] += module['module_name'] + \
-                    ' ' + module['semantic_version'] + ';'
-            rec['Modules'] = rec['Modules'][:-1]  
-            rec['TLS'] = bdb['tls_mode']       
-            rec['Authentication'] = SupportPackage.get_authenciation_scheme(bdb)
-            rec['OSS Cluster API'] = bdb['oss_cluster']
-            rec['Proxy Policy'] = bdb['proxy_policy']
-            rec['Shard Placement'] = bdb['shards_placement']
-            endpoints = bdb['endpoints']            
-            for endpoint in endpoints:                
+            rec = DatabaseRecord(
+                fqdn=fqdn,
+                uid=bdb['uid'],
+                name=bdb['name'],
+                version=bdb['version'],
+                total_shards=bdb['shards_count'] if not bdb['slave_ha'] else bdb['shards_count'] * 2,
+                memory=round((bdb['memory_size']/ (1024 ** 3)),2),
+                high_availability=bdb['slave_ha'],
+                flex=bdb['bigstore'],
+                created=SupportPackage.convert_zulu_string(bdb['created_time']),
+                modified=SupportPackage.convert_zulu_string(bdb['last_changed_time']),
+                persistence=bdb['data_persistence'],
+                eviction_policy=bdb['eviction_policy'],
+                crdb=bdb['crdt'],
+                modules=";".join(module['module_name'] + ' ' + module['semantic_version']
+                                 for module in bdb['module_list']),
+                tls=bdb['tls_mode'],
+                authentication=SupportPackage.get_authenciation_scheme(bdb),
+                oss_cluster=bdb['oss_cluster'],
+                proxy_policy=bdb['proxy_policy'],
+                shard_placement=bdb['shards_placement'],
+            )
+            for endpoint in bdb['endpoints']:
                 nameport = endpoint['dns_name'] + ":" + str(endpoint['port'])
                 if endpoint['addr_type'] == "external":
-                    rec['External Endpoint'] = nameport
+                    rec.external_endpoint = nameport
                 else:
-                    rec['Internal Endpoint'] = nameport
+                    rec.internal_endpoint = nameport
             bdbs.append(rec)
-        return sorted(bdbs, key=lambda x:(x['fqdn'], x['Id']))
+        return sorted(bdbs, key=attrgetter("fqdn", "uid"))
 
     @staticmethod
     def get_bdbs(fqdn, ip, username, password):
@@ -218,70 +350,233 @@ class SupportPackage:
     @staticmethod
     def get_shard_info(bdb_json,fqdn,ip,username,password):
         response = SupportPackage.api_request(fqdn,ip,username,password,"/v1/shards")        
-        shard_json = json.loads(response.text)
+        return SupportPackage.deserialize_shards(fqdn, bdb_json, json.loads(response.text))
+
+    @staticmethod
+    def deserialize_shards(fqdn, bdb_json, shard_json):
+        """deserialize the /v1/shards json"""
+        bdb_names = index_by_uid(bdb_json)
         shards = []
         for item in shard_json:
-            shard={}
-            shard['fqdn'] = fqdn 
-            shard['database id'] = item['bdb_uid']
-            shard['node id']=int(item['node_uid'])
-            shard['database name']=next((i["name"] for i in bdb_json if i["uid"]==item["bdb_uid"]))
-            shard['id']=int(item['uid'])
-            shard['role']=item['role']
-            shard['slots']=item['assigned_slots']
-            shards.append(shard)
-        return sorted(shards, key=lambda x: (x["database id"], x["id"]))               
+            shards.append(ShardRecord(
+                fqdn=fqdn,
+                bdb_uid=item['bdb_uid'],
+                node_uid=int(item['node_uid']),
+                bdb_name=bdb_names[item["bdb_uid"]],
+                uid=int(item['uid']),
+                role=item['role'],
+                slots=item['assigned_slots'],
+            ))
+        return sorted(shards, key=attrgetter("bdb_uid", "uid"))               
 
     @staticmethod
     def get_ciphers(fqdn,cluster_json):
-        ciphers = []        
-        if cluster_json['control_cipher_suites']:
-            cipher = {}
-            cipher['fqdn'] = fqdn
-            cipher['type'] = 'control plane'
-            cipher['ciphers'] = cluster_json['control_cipher_suites']
-            ciphers.append(cipher)
-        if cluster_json['control_cipher_suites_tls_1_3']:
-            cipher = {}
-            cipher['fqdn'] = fqdn
-            cipher['type'] = 'control plane TLS 1.3'
-            cipher['ciphers'] = cluster_json['control_cipher_suites_tls_1_3']
-            ciphers.append(cipher)
-        if cluster_json['data_cipher_list']:
-            cipher = {}
-            cipher['fqdn'] = fqdn
-            cipher['type'] = 'data plane ciphers'
-            cipher['ciphers'] = cluster_json['data_cipher_list']
-            ciphers.append(cipher)
-        if cluster_json['data_cipher_suites_tls_1_3']:
-            cipher = {}
-            cipher['fqdn'] = fqdn
-            cipher['type'] = 'data plane ciphers TLS 1.3'
-            cipher['ciphers'] = cluster_json['data_cipher_suites_tls_1_3']
-            ciphers.append(cipher)
-        if cluster_json['sentinel_cipher_suites']:
-            cipher = {}
-            cipher['fqdn'] = fqdn
-            cipher['type'] = 'sentinel ciphers'
-            cipher['ciphers'] = cluster_json['sentinel_cipher_suites']
-            ciphers.append(cipher)
-        if cluster_json['sentinel_cipher_suites_tls_1_3']:
-            cipher = {}
-            cipher['fqdn'] = fqdn
-            cipher['type'] = 'sentinel ciphers TLS 1.3'
-            cipher['ciphers'] = cluster_json['sentinel_cipher_suites_tls_1_3']
-            ciphers.append(cipher)
+        ciphers = []
+        for setting, cipher_type in SupportPackage.cipher_settings:
+            if cluster_json[setting]:
+                ciphers.append(CipherRecord(
+                    fqdn=fqdn, type=cipher_type, ciphers=cluster_json[setting]))
         return ciphers
 
+    @staticmethod
+    def save_package(logger, fqdn, spool, fname, reduce_tar_size,
+                     tar_options, report_rules=False):
+        """save a downloaded support package to fname, reducing it on the way"""
+        if not reduce_tar_size:
+            # saved as sent by the cluster
+            os.replace(spool, fname)
+            return
+        buffer_size = tar_options.get("buffer_size", 1024 * 1024)
+        part_name = fname + ".part"
+        try:
+            with open(spool, "rb", buffering=buffer_size) as source, \
+                    open(part_name, "wb", buffering=buffer_size) as f:
+                logger.info(f"({fqdn}):Reducing Package Size")
+                tar_processor = TarProcessor(**tar_options)
+                savings, original_size, new_size = tar_processor.process_stream(
+                    source, f)
+                logger.info(
+                    f"({fqdn}):Original tar size: {original_size}MB")
+                logger.info(f"({fqdn}):New tar size: {new_size}MB")
+                logger.info(f"({fqdn}):Storage savings: {savings}MB")
+                if report_rules:
+                    for line in ReductionPolicy.format_report(tar_processor.rule_stats):
+                        logger.info(f"({fqdn}):{line}")
+            os.replace(part_name, fname)
+        finally:
+            if os.path.exists(part_name):
+                os.remove(part_name)
+
+    @staticmethod
+    def load_spool_state(spool, apipath):
+        """
+        State of a spool left by an interrupted download of the same package.
+        A spool is only resumed across runs when the cluster identified the
+        package with an ETag or Last-Modified validator.
+        """
+        state_name = spool + ".json"
+        if os.path.exists(spool) and os.path.exists(state_name):
+            try:
+                with open(state_name, "r", encoding="utf-8") as file:
+                    state = json.load(file)
+                if state.get("apipath") == apipath and state.get("validator"):
+                    return state
+            except ValueError:
+                pass
+        for name in (spool, state_name):
+            if os.path.exists(name):
+                os.remove(name)
+        return {"apipath": apipath, "validator": None, "total": None, "resumable": False}
+
+    @staticmethod
+    def spool_package(logger, fqdn, ip, username, password, apipath, spool, buffer_size):
+        """
+        Download a support package to a spool file.
+        An interrupted transfer resumes from the end of the spool with an
+        If-Range protected HTTP Range request when the cluster accepts byte
+        ranges and identified the package with a validator, and starts over
+        otherwise, with a jittered backoff between attempts (outside the
+        heavy request slot). Progress and throughput are logged while
+        downloading, and a package shorter than its Content-Length is
+        downloaded again.
+
+        :return: The size of the package in bytes.
+        """
+        state = SupportPackage.load_spool_state(spool, apipath)
+        attempt = 0
+        while True:
+            attempt += 1
+            offset = os.path.getsize(spool) if os.path.exists(spool) else 0
+            headers = None
+            # debuginfo packages are built per request, without a validator the
+            # rest of the package may come from another package
+            if offset and state["resumable"] and state["validator"]:
+                headers = {"Range": f"bytes={offset}-", "If-Range": state["validator"]}
+                logger.info(f"({fqdn}):Resuming Download at {round(offset / 1024 / 1024, 1)}MB")
+            try:
+                # the heavy slot bounds the debuginfo collections of the fleet,
+                # it is released during the retry backoff
+                with RequestScheduler.slot(fqdn, apipath, heavy=True):
+                    try:
+                        response = SupportPackage.api_request(
+                            fqdn, ip, username, password, apipath, stream=True,
+                            headers=headers)
+                    except ApiError as e:
+                        if e.status != 416:
+                            raise
+                        # the spool does not match the package any more
+                        logger.info(f"({fqdn}):Range not satisfiable, restarting download")
+                        os.remove(spool)
+                        continue
+                    with response:
+                        if response.status_code == 206 and headers is not None:
+                            if not response.headers.get("Content-Range", "").startswith(
+                                    f"bytes {offset}-"):
+                                logger.info(f"({fqdn}):Unexpected range, restarting download")
+                                os.remove(spool)
+                                continue
+                            mode = "ab"
+                        else:
+                            # full content, the cluster ignored or refused the range
+                            mode, offset = "wb", 0
+                            state["validator"] = (response.headers.get("ETag")
+                                                  or response.headers.get("Last-Modified"))
+                            state["resumable"] = response.headers.get("Accept-Ranges") == "bytes"
+                            length = response.headers.get("Content-Length")
+                            state["total"] = (int(length) if length and length.isdigit()
+                                              else None)
+                            with open(spool + ".json", "w", encoding="utf-8") as file:
+                                json.dump(state, file)
+                        SupportPackage.receive_package(
+                            logger, fqdn, response, spool, mode, offset, state["total"],
+                            buffer_size)
+            except (requests.exceptions.RequestException, urllib3.exceptions.HTTPError) as e:
+                if isinstance(e, ApiError) and not e.retryable:
+                    raise
+                if attempt >= SupportPackage.download_attempts:
+                    if isinstance(e, ApiError):
+                        raise
+                    raise ApiError(fqdn, apipath, "request", f"Download interrupted: {e}",
+                                   attempts=attempt) from e
+                delay = RetryPolicy.delay(attempt)
+                received = os.path.getsize(spool) if os.path.exists(spool) else 0
+                logger.info(f"({fqdn}):Download interrupted at "
+                            f"{round(received / 1024 / 1024, 1)}MB ({e}), "
+                            f"retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            size = os.path.getsize(spool)
+            if state["total"] is not None and size != state["total"]:
+                if attempt >= SupportPackage.download_attempts:
+                    raise ApiError(fqdn, apipath, "request",
+                                   f"Incomplete download ({size} of {state['total']} bytes)")
+                logger.info(f"({fqdn}):Incomplete download ({size} of {state['total']} bytes)")
+                continue
+            return size
+
+    @staticmethod
+    def receive_package(logger, fqdn, response, spool, mode, offset, total, buffer_size):
+        """write a package response to the spool, logging progress and throughput"""
+        # byte ranges address the package as sent, it is spooled undecoded
+        source = response.raw
+        source.decode_content = False
+        received = offset
+        start = last_report = time.monotonic()
+        with open(spool, mode, buffering=buffer_size) as file:
+            for chunk in iter(lambda: source.read(SupportPackage.chunk_size), b""):
+                file.write(chunk)
+                received += len(chunk)
+                now = time.monotonic()
+                if now - last_report >= SupportPackage.progress_interval:
+                    last_report = now
+                    SupportPackage.log_progress(logger, fqdn, received, offset, total,
+                                                now - start)
+        SupportPackage.log_progress(logger, fqdn, received, offset, total,
+                                    time.monotonic() - start)
+
+    @staticmethod
+    def log_progress(logger, fqdn, received, offset, total, elapsed):
+        """log download progress and throughput"""
+        mb = round(received / 1024 / 1024, 1)
+        rate = round((received - offset) / 1024 / 1024 / elapsed, 1) if elapsed > 0 else 0
+        if total:
+            logger.info(f"({fqdn}):Downloaded {mb}MB of {round(total / 1024 / 1024, 1)}MB "
+                        f"({received * 100 // total}%) at {rate}MB/s")
+        else:
+            logger.info(f"({fqdn}):Downloaded {mb}MB at {rate}MB/s")
+
     @staticmethod
     def download_package(logger, fqdn, ip, username, password, path, db,
-                         reduce_tar_size, save_to_file=True, upload=True, dry_run=False):
-        """Download suppport package"""
+                         reduce_tar_size, save_to_file=True, upload=True, dry_run=False,
+                         tar_options=None, report_rules=False, uploads=None):
+        """
+        Download suppport package
+
+        :param tar_options: TarProcessor keyword arguments used for the reduction
+                            (buffer_size, nested, compression, compress_level, policy).
+        :param report_rules: Log the effect of each reduction rule.
+        :param uploads: UploadQueue uploading the package in the background
+                        (the package is uploaded inline without one).
+        A failed download raises the error to the caller.
+        """
+        tar_options = tar_options if tar_options else {}
+        # packages that are not reduced are saved as sent by the cluster
+        compression = tar_options.get("compression", "gz")
+        suffix = Compressors.suffix(compression if reduce_tar_size else "gz")
+        fname = SupportPackage.get_fname(fqdn, path, suffix)
+        # packages that are only uploaded are staged in a hidden file of the
+        # output folder, where a queued upload still finds it on the next run
+        target = fname if save_to_file else os.path.join(
+            os.path.dirname(fname), "." + os.path.basename(fname))
+        # the raw download is spooled under a stable name so an interrupted
+        # download can be resumed by the next run
+        spool = os.path.join(os.path.dirname(target),
+                             f".debuginfo.{fqdn}.{db}.download")
+        queued = False
         try:
-            output_bytes = []
-            host = fqdn if (ip is None) else ip
             if db != 0:
-                logger.info(f"Database:{db}")
+                logger.info(f"({fqdn}):Database:{db}")
                 apipath = f"/v1/debuginfo/node/bdb/{db}" 
             else:
                 apipath = "/v1/debuginfo/all"
@@ -290,30 +585,20 @@ class SupportPackage:
 
             logger.info(f"({fqdn}):Starting Download")
             if not dry_run:
-                response = SupportPackage.api_request(fqdn,ip,username,password,apipath)                
-            else:
-                logger.info("Dryrun Only")
-
-            fname = SupportPackage.get_fname(fqdn, path)
-
-            if reduce_tar_size:
-                logger.info(f"({fqdn}):Reducing Package Size")
-                if not dry_run:
-                    tar_processor_bytes = TarProcessor()
-                    savings, original_size, new_size, output_bytes = tar_processor_bytes.process_from_bytes(
-                        response.content)
-                    logger.info(
-                        f"({fqdn}):Original tar size: {original_size}MB")
-                    logger.info(f"({fqdn}):New tar size: {new_size}MB")
-                    logger.info(f"({fqdn}):Storage savings: {savings}MB")
+                size = SupportPackage.spool_package(
+                    logger, fqdn, ip, username, password, apipath, spool,
+                    tar_options.get("buffer_size", 1024 * 1024))
+                logger.info(f"({fqdn}):Download complete ({round(size / 1024 / 1024, 1)}MB)")
+                SupportPackage.save_package(
+                    logger, fqdn, spool, target, reduce_tar_size, tar_options, report_rules)
+                # the package is saved, the spool is no longer needed
+                for name in (spool, spool + ".json"):
+                    if os.path.exists(name):
+                        os.remove(name)
             else:
-                if not dry_run:
-                    output_bytes = response.content
+                logger.info(f"({fqdn}):Dryrun Only")
 
             if save_to_file:
-                if not dry_run:
-                    with open(fname, "wb") as f:
-                        f.write(output_bytes)
                 logger.info(
                     f"({fqdn}):Support Package Downloaded and Saved:({fname})")
 
@@ -321,19 +606,24 @@ class SupportPackage:
                 if not reduce_tar_size:
                     logger.info(
                         f"{fqdn}:Uploading Bloated Support Packages Not Supported")
+                elif uploads is not None:
+                    logger.info(f"({fqdn}):Queued for upload to redis.io")
+                    if not dry_run:
+                        # a staged package is removed by the queue once uploaded
+                        uploads.submit(target, fname, remove=not save_to_file)
+                        queued = True
                 else:
                     logger.info(f"({fqdn}):Uploading to redis.io")
                     if not dry_run:
                         try:
-                            FilesUploader.upload_bytes(output_bytes, fname)
-                            # FilesUploader.upload_file(fname)
+                            FilesUploader.upload_with_retry(logger, target, fname)
                             logger.info(
                                 f"({fqdn}):Support package uploaded successfully.")
                         except Exception as e:
-                            logger.exception(e, "Error During Upload")
-
-        except requests.exceptions.RequestException as e:
-            logger.exception(e, f"({fqdn}):Error downloading support package")
+                            logger.exception(e, f"({fqdn}):Error During Upload")
+        finally:
+            if not save_to_file and not queued and os.path.exists(target):
+                os.remove(target)
 
     @staticmethod
     def deserialize_certificates(fqdn,cluster_json):
@@ -341,14 +631,14 @@ class SupportPackage:
         for certname, pem in cluster_json.items():
             if 'cert' in certname and isinstance(cluster_json[certname],str):
                 inspector = CertificateInspector(pem)
-                output = {}
-                output["fqdn"] = fqdn
-                output["source"] = "cluster"                
-                output["cert"] = certname
-                output["expiration"] = inspector.get_expiration_date().strftime("%Y-%m-%d %H:%M:%S")
-                output["subject"] = str(inspector.get_subject())
-                output["issuer"] = str(inspector.get_issuer())
-                outputs.append(output)       
+                outputs.append(CertificateRecord(
+                    fqdn=fqdn,
+                    source="cluster",
+                    cert=certname,
+                    expiration=inspector.get_expiration_date().strftime("%Y-%m-%d %H:%M:%S"),
+                    subject=str(inspector.get_subject()),
+                    issuer=str(inspector.get_issuer()),
+                ))
         return outputs    
 
     @staticmethod
@@ -356,15 +646,15 @@ class SupportPackage:
         bdb_certs = []
         for bdb in bdbs:
             for cert in bdb["authentication_ssl_client_certs"]:
-                bdb_cert = {}
                 inspector = CertificateInspector(cert["client_cert"])
-                bdb_cert["fqdn"] = fqdn
-                bdb_cert["source"] = f"{bdb['name']} ({bdb['uid']})" 
-                bdb_cert["cert"] = "client cert"                
-                bdb_cert["expiration"] = inspector.get_expiration_date().strftime("%Y-%m-%d %H:%M:%S")
-                bdb_cert["subject"] = str(inspector.get_subject())
-                bdb_cert["issuer"] = str(inspector.get_issuer())
-                bdb_certs.append(bdb_cert)
+                bdb_certs.append(CertificateRecord(
+                    fqdn=fqdn,
+                    source=f"{bdb['name']} ({bdb['uid']})",
+                    cert="client cert",
+                    expiration=inspector.get_expiration_date().strftime("%Y-%m-%d %H:%M:%S"),
+                    subject=str(inspector.get_subject()),
+                    issuer=str(inspector.get_issuer()),
+                ))
         return bdb_certs        
 
     @staticmethod
@@ -375,48 +665,56 @@ class SupportPackage:
             certificates.append(cert)       
         bdb_certs = SupportPackage.get_bdb_certs(fqdn,bdb_json)
         certificates.extend(bdb_certs)
-        return sorted(certificates, key=lambda x:(x['fqdn'], x['source'], x['cert']))
+        return sorted(certificates, key=attrgetter("fqdn", "source", "cert"))
    
     @staticmethod
     def get_roles_acls(bdb_json,fqdn, ip, username, password):
         response = SupportPackage.api_request(fqdn,ip,username,password,"/v1/roles")        
-        data = json.loads(response.text)
-        
+        roles_json = json.loads(response.text)
+
+        response = SupportPackage.api_request(fqdn,ip,username,password,"/v1/redis_acls")
+        acls_json = json.loads(response.text)
+
+        #holding off on users because of RE permissions required (Admin)
+        #users = SupportPackage.api_request(fqdn,ip,username,password,"/v1/users")
+
+        return (SupportPackage.deserialize_roles(fqdn, roles_json),
+                SupportPackage.deserialize_acls(fqdn, acls_json),
+                SupportPackage.deserialize_permissions(fqdn, bdb_json, roles_json, acls_json))
+
+    @staticmethod
+    def deserialize_roles(fqdn, data):
+        """deserialize the /v1/roles json"""
         roles = []
         
         for item in data:
-            role = {}
-            role["fqdn"]=fqdn
-            role["uid"]=item["uid"]
-            role["name"] =item["name"]
-            role["management"]=item["management"]
-            roles.append(role)
+            roles.append(RoleRecord(
+                fqdn=fqdn, uid=item["uid"], name=item["name"], management=item["management"]))
+        return sorted(roles, key=attrgetter("uid"))
 
-        response = SupportPackage.api_request(fqdn,ip,username,password,"/v1/redis_acls")
-        data = json.loads(response.text)
+    @staticmethod
+    def deserialize_acls(fqdn, data):
+        """deserialize the /v1/redis_acls json"""
         acls = []
         for item in data:
-            acl = {}
-            acl["fqdn"]=fqdn
-            acl["uid"]=item["uid"]
-            acl["name"]=item["name"]
-            acl["acl"]=item["acl"]
-            acls.append(acl)
+            acls.append(AclRecord(
+                fqdn=fqdn, uid=item["uid"], name=item["name"], acl=item["acl"]))
+        return sorted(acls, key=attrgetter("uid"))
 
+    @staticmethod
+    def deserialize_permissions(fqdn, bdb_json, roles, acls):
+        """database role permissions, with role and acl names from the /v1/roles and /v1/redis_acls json"""
+        role_names = index_by_uid(roles)
+        acl_names = index_by_uid(acls)
         roles_permissions = []
         for bdb in bdb_json:
-            rules = bdb["roles_permissions"]
-            for rule in rules:
-                role_permission = {}
-                role_permission["fqdn"]=fqdn
-                role_permission["Id"]=bdb["uid"]
-                role_permission["Name"]=bdb["name"]
-                role_permission["Order"]=rule["order"]
-                role_permission["Role"]=next((i["name"] for i in roles if i["uid"]==rule["role_uid"]))
-                role_permission["Acl"]=next((i["name"] for i in acls if i["uid"]==rule["redis_acl_uid"]))
-                roles_permissions.append(role_permission)
-
-        #holding off on users because of RE permissions required (Admin)
-        #users = SupportPackage.api_request(fqdn,ip,username,password,"/v1/users")
-
-        return sorted(roles, key=lambda x:x["uid"]), sorted(acls, key=lambda x:x["uid"]), roles_permissions  
\ No newline at end of file
+            for rule in bdb["roles_permissions"]:
+                roles_permissions.append(PermissionRecord(
+                    fqdn=fqdn,
+                    bdb_uid=bdb["uid"],
+                    bdb_name=bdb["name"],
+                    order=rule["order"],
+                    role=role_names[rule["role_uid"]],
+                    acl=acl_names[rule["redis_acl_uid"]],
+                ))
+        return roles_permissions  
\ No newline at end of file
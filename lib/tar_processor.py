@@ -1,7 +1,23 @@
 """tar processor module"""
+import atexit
+import multiprocessing
 import tarfile
+import tempfile
+import threading
+import shutil
+import gzip
+import struct
 import os
 import io
+from contextlib import closing
+from concurrent.futures import Future, ProcessPoolExecutor
+from .compressors import Compressors
+from .reduction_policy import ReductionPolicy
+
+# gzip, bzip2 and xz signatures
+COMPRESSED_MAGIC = (b"\x1f\x8b", b"BZh", b"\xfd7zXZ\x00")
+
+NESTED_TAR_SUFFIX = '.tar.gz'
 
 
 def divide_and_round(number):
@@ -10,130 +26,311 @@ def divide_and_round(number):
     return round(result, 2)
 
 
+class CountingReader:
+    """Read-only file wrapper counting the bytes read from a stream"""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        """read and count"""
+        data = self.fileobj.read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+class NullWriter:
+    """Write-only sink counting the bytes written, used for dry runs"""
+
+    def __init__(self):
+        self.bytes_written = 0
+
+    def write(self, data):
+        """count and discard"""
+        self.bytes_written += len(data)
+        return len(data)
+
+    def tell(self):
+        """bytes written so far"""
+        return self.bytes_written
+
+
 class TarProcessor:
     """tar processor class"""
 
-    def __init__(self, source_tar="", destination_tar="", exclude_files=None):
+    nested_pool = None
+    nested_pool_lock = threading.Lock()
+
+    def __init__(self, source_tar="", destination_tar="", exclude_files=None,
+                 buffer_size=1024 * 1024, nested=False, nested_workers=None,
+                 compression="gz", compress_level=None, compress_workers=None,
+                 policy=None):
         """
         Initialize the TarProcessor class.
         :param source_tar: Path to the original tar file.
         :param destination_tar: Path to the new tar file.
         :param exclude_files: A list of files (with paths) to be excluded.
+        :param buffer_size: Read/write buffer size in bytes for streaming mode.
+        :param nested: Reduce nested .tar.gz/.gz members instead of excluding them.
+        :param nested_workers: Size of the process pool reducing nested members
+                               (None for one per cpu, 0 to reduce in process).
+        :param compression: Compression of the new tar (gz, xz or zst).
+        :param compress_level: Compression level (default depends on compression).
+        :param compress_workers: Compression threads (None for one per cpu).
+        :param policy: A ReductionPolicy (default reproduces the built-in rules
+                       from lines_to_tail, exclude_files and nested).
         """
         self.lines_to_tail = 500
         self.source_tar = source_tar
         self.destination_tar = destination_tar
         self.exclude_files = exclude_files if exclude_files else []
+        self.buffer_size = buffer_size
+        self.nested = nested
+        self.nested_workers = nested_workers
+        self.compression = compression
+        self.compress_level = compress_level
+        self.compress_workers = compress_workers
+        self.policy = policy
+        self.rule_stats = {}
 
-    def tail_file(self, content):
-        """
-        Get the last n lines from a text content.
+    def get_policy(self):
+        """reduction policy of this processor"""
+        if self.policy is None:
+            self.policy = ReductionPolicy.default(
+                self.lines_to_tail, self.exclude_files, self.nested)
+        return self.policy
 
-        :param content: The text content of the file.
-        :return: The truncated content containing the last 100 lines.
-        """
-        lines = content.splitlines()
-        return "\n".join(lines[-self.lines_to_tail:])
+    def record(self, rule, original, kept):
+        """record the effect of a rule on a member"""
+        stats = self.rule_stats.setdefault(
+            rule.name, {"members": 0, "original": 0, "kept": 0})
+        stats["members"] += 1
+        stats["original"] += original
+        stats["kept"] += kept
+
+    @staticmethod
+    def is_plain_tar(source):
+        """check for an uncompressed tar on a seekable file object"""
+        seekable = getattr(source, "seekable", None)
+        if seekable is None or not seekable():
+            return False
+        position = source.tell()
+        magic = source.read(6)
+        source.seek(position)
+        return not magic.startswith(COMPRESSED_MAGIC)
 
     def process_from_file(self):
         """
-        Copy contents of the source tar file to a new tar file.
-        Excludes specific files and truncates .log files to the last 100 lines.
-        Excludes any .gz files found inside the tar file.
+        Reduce the source tar file into the destination tar file.
+        The new tar is written to a .part file next to the destination
+        and atomically renamed into place once it is complete.
 
-        :return: A tuple containing storage savings, original size, and new size.
+        :return: A tuple containing storage savings, original size, and new size in MB.
         """
-        with tarfile.open(self.source_tar, 'r:*') as original_tar:
-            with tarfile.open(self.destination_tar, 'w:gz') as new_tar:
-                for member in original_tar.getmembers():
-                    # Exclude .gz files or files in the exclude_files list
-                    if member.name.endswith(
-                            '.gz') or member.name in self.exclude_files:
-                        # print(f"Excluding file: {member.name}")
-                        continue
+        temp_name = self.destination_tar + ".part"
+        try:
+            with open(self.source_tar, 'rb', buffering=self.buffer_size) as source:
+                with open(temp_name, 'wb', buffering=self.buffer_size) as destination:
+                    result = self.process_stream(source, destination)
+            os.replace(temp_name, self.destination_tar)
+        finally:
+            if os.path.exists(temp_name):
+                os.remove(temp_name)
 
-                    # Extract the file content
-                    file_obj = original_tar.extractfile(member)
-                    if file_obj:
-                        content = file_obj.read()
-
-                        # Check if it's a .log file and truncate to the last
-                        # 100 lines if so
-                        if member.name.endswith('.log'):
-                            try:
-                                content_str = content.decode('utf-8')
-                                truncated_content = self.tail_file(content_str)
-                                content = truncated_content.encode('utf-8')
-                            except UnicodeDecodeError:
-                                print(
-                                    f"Warning: Failed to decode {member.name} as UTF-8.")
-
-                        # Add the file to the new tar file
-                        new_member = tarfile.TarInfo(name=member.name)
-                        new_member.size = len(content)
-                        new_tar.addfile(
-                            new_member, fileobj=io.BytesIO(content))
-
-        # Calculate storage savings
-        original_size = os.path.getsize(self.source_tar)
-        new_size = os.path.getsize(self.destination_tar)
-        storage_savings = original_size - new_size
+        return result
 
-        return storage_savings, original_size, new_size
+    def predict(self):
+        """
+        Dry run: reduce the source tar file without writing the new tar.
+        The predicted effect of each rule is available in rule_stats.
+
+        :return: A tuple containing storage savings, original size, and new size in MB.
+        """
+        with open(self.source_tar, 'rb', buffering=self.buffer_size) as source:
+            return self.process_stream(source, NullWriter())
 
     def process_from_bytes(self, source_bytes):
         """
         Process the source tar data from a bytes object instead of a file.
 
         :param source_bytes: A bytes object representing a tar archive.
-        :return: A tuple containing storage savings, original size, and new size.
+        :return: A tuple containing storage savings, original size, new size
+                 in MB and the new tar as bytes.
         """
-        original_size = len(source_bytes)
-
-        # Create a BytesIO object from the source bytes
-        source_io = io.BytesIO(source_bytes)
-
-        # Open the source tar file from bytes
-        with tarfile.open(fileobj=source_io, mode='r:*') as original_tar:
-            # Prepare a BytesIO object to hold the new tar data
-            destination_io = io.BytesIO()
-
-            with tarfile.open(fileobj=destination_io, mode='w:gz') as new_tar:
-                for member in original_tar.getmembers():
-                    # Exclude .gz files or files in the exclude_files list
-                    if member.name.endswith(
-                            '.gz') or member.name in self.exclude_files:
-                        # print(f"Excluding file: {member.name}")
+        destination_io = io.BytesIO()
+        storage_savings, original_size, new_size = self.process_stream(
+            io.BytesIO(source_bytes), destination_io)
+
+        return storage_savings, original_size, new_size, destination_io.getvalue()
+
+    def process_stream(self, source, destination):
+        """
+        Reduce a tar archive read sequentially from a stream (for example an
+        http response body) and write the new tar to a file object.
+        Members are copied through a buffer of buffer_size bytes so that
+        memory use does not depend on the size of the package.
+
+        :param source: A readable binary file object positioned at the start of the tar.
+        :param destination: A writable binary file object for the new tar.
+        :return: A tuple containing storage savings, original size, and new size in MB.
+        """
+        start = destination.tell()
+        seekable = TarProcessor.is_plain_tar(source)
+        if seekable:
+            # uncompressed archives are opened for random access so that logs
+            # are tailed from their end and the rest of them is never read
+            position = source.tell()
+            original_size = source.seek(0, io.SEEK_END) - position
+            source.seek(position)
+            original_tar = tarfile.open(fileobj=source, mode='r:')
+        else:
+            reader = CountingReader(source)
+            original_tar = tarfile.open(fileobj=reader, mode='r|*',
+                                        bufsize=self.buffer_size)
+
+        writer = Compressors.open_writer(
+            destination, self.compression, self.compress_level, self.compress_workers)
+        with original_tar, tempfile.TemporaryDirectory() as spool_dir, closing(writer):
+            with tarfile.open(fileobj=writer, mode='w|',
+                              copybufsize=self.buffer_size) as new_tar:
+                policy = self.get_policy()
+                nested = []
+                for member in original_tar:
+                    if not member.isfile():
+                        continue
+
+                    rule = policy.match(member.name)
+                    if rule.action == "drop":
+                        self.record(rule, member.size, 0)
                         continue
 
-                    # Extract the file content
                     file_obj = original_tar.extractfile(member)
-                    if file_obj:
-                        content = file_obj.read()
-
-                        # Check if it's a .log file and truncate to the last
-                        # 100 lines if so
-                        if member.name.endswith('.log'):
-                            try:
-                                content_str = content.decode('utf-8')
-                                truncated_content = self.tail_file(content_str)
-                                content = truncated_content.encode('utf-8')
-                            except UnicodeDecodeError:
-                                print(
-                                    f"Warning: Failed to decode {member.name} as UTF-8.")
-
-                        # Add the file to the new tar file
-                        new_member = tarfile.TarInfo(name=member.name)
-                        new_member.size = len(content)
-                        new_tar.addfile(
-                            new_member, fileobj=io.BytesIO(content))
-
-        # Get the size of the new tar data in bytes
-        new_size = destination_io.tell()
-        storage_savings = original_size - new_size
+                    if rule.action == "nested":
+                        nested.append(self.submit_nested(
+                            rule, member, file_obj, spool_dir, len(nested)))
+                        continue
 
-        # Return to the start of the BytesIO object for further use
-        destination_io.seek(0)
+                    # kept members are copied through the buffer, never held in memory
+                    content, size = ReductionPolicy.apply(
+                        rule, file_obj, member.size, seekable, self.buffer_size)
+                    new_member = tarfile.TarInfo(name=member.name)
+                    new_member.size = size
+                    new_tar.addfile(new_member, fileobj=content)
+                    self.record(rule, member.size, size)
+
+                # nested archives are appended once their reduction completes
+                for rule, member, spool_name, future in nested:
+                    self.add_nested(new_tar, rule, member, spool_name, future)
+
+        if not seekable:
+            original_size = reader.bytes_read
+        new_size = destination.tell() - start
+        storage_savings = original_size - new_size
 
         return divide_and_round(storage_savings), divide_and_round(
-            original_size), divide_and_round(new_size), destination_io.getvalue()
+            original_size), divide_and_round(new_size)
+
+    def submit_nested(self, rule, member, file_obj, spool_dir, index):
+        """
+        Spool a nested .tar.gz/.gz member to disk and submit its reduction.
+
+        :return: A tuple containing the rule, the member, the spool file and a future.
+        """
+        spool_name = os.path.join(spool_dir, f"{index}.gz")
+        with open(spool_name, 'wb') as spool:
+            shutil.copyfileobj(file_obj, spool, self.buffer_size)
+
+        args = (spool_name, member.name, self.get_policy(), self.buffer_size)
+        if self.nested_workers == 0:
+            # already inside a worker process, reduce in place
+            future = Future()
+            try:
+                future.set_result(reduce_nested_member(*args))
+            except Exception as e:
+                future.set_exception(e)
+        else:
+            future = TarProcessor.get_nested_pool(
+                self.nested_workers).submit(reduce_nested_member, *args)
+        return rule, member, spool_name, future
+
+    def add_nested(self, new_tar, rule, member, spool_name, future):
+        """add the reduced nested member, keeping the original if it cannot be reduced"""
+        try:
+            reduced_name = future.result()
+        except Exception as e:
+            print(f"Warning: Failed to reduce nested archive {member.name}: {e}")
+            reduced_name = spool_name
+
+        if reduced_name is None:
+            self.record(rule, member.size, 0)
+            return
+
+        new_member = tarfile.TarInfo(name=member.name)
+        new_member.size = os.path.getsize(reduced_name)
+        with open(reduced_name, 'rb') as f:
+            new_tar.addfile(new_member, fileobj=f)
+        self.record(rule, member.size, new_member.size)
+
+    @staticmethod
+    def get_nested_pool(workers=None):
+        """
+        Process pool shared by all reductions of the run, shut down at exit.
+        The pool is created from worker threads while compression threads
+        run, so its processes are spawned rather than forked (forking a
+        multithreaded process can deadlock the child).
+        """
+        with TarProcessor.nested_pool_lock:
+            if TarProcessor.nested_pool is None:
+                TarProcessor.nested_pool = ProcessPoolExecutor(
+                    max_workers=workers if workers else os.cpu_count(),
+                    mp_context=multiprocessing.get_context("spawn"))
+                atexit.register(TarProcessor.shutdown_nested_pool)
+            return TarProcessor.nested_pool
+
+    @staticmethod
+    def shutdown_nested_pool():
+        """stop the worker processes of the shared pool"""
+        with TarProcessor.nested_pool_lock:
+            if TarProcessor.nested_pool is not None:
+                TarProcessor.nested_pool.shutdown(wait=True)
+                TarProcessor.nested_pool = None
+
+
+def reduce_nested_member(spool_name, name, policy, buffer_size):
+    """
+    Reduce a nested member spooled to disk. Runs in a worker process.
+    Nested tar archives are reduced with the same policy (recursively, in
+    process). Other .gz members are decompressed, reduced by the rule
+    matching their name without .gz and compressed again.
+
+    :param spool_name: Path of the spooled member.
+    :param name: Name of the member in the archive.
+    :param policy: The ReductionPolicy of the package.
+    :return: Path of the reduced member, or None when it is dropped.
+    """
+    reduced_name = spool_name + ".reduced"
+    if name.endswith(NESTED_TAR_SUFFIX):
+        # nested archives keep their .tar.gz name, workers already use every cpu
+        processor = TarProcessor(spool_name, reduced_name, buffer_size=buffer_size,
+                                 nested_workers=0, compress_workers=1, policy=policy)
+        processor.process_from_file()
+        return reduced_name
+
+    rule = policy.match(name[:-len('.gz')])
+    if rule is policy.fallback or rule.action in ("drop", "nested"):
+        # other compressed members are excluded
+        return None
+
+    if rule.action == "keep":
+        return spool_name
+
+    # uncompressed size (modulo 4GB) from the gzip trailer
+    with open(spool_name, 'rb') as spool:
+        spool.seek(-4, io.SEEK_END)
+        size = struct.unpack("<I", spool.read(4))[0]
+
+    with gzip.open(spool_name, 'rb') as source, gzip.open(reduced_name, 'wb') as destination:
+        content, _size = ReductionPolicy.apply(rule, source, size, False, buffer_size)
+        shutil.copyfileobj(content, destination, buffer_size)
+    return reduced_name
@@ -0,0 +1,148 @@
+"""upload queue module"""
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from .files_uploader import FilesUploader
+
+
+class UploadQueue:
+    """
+    Upload Queue Class.
+    Uploads support packages to redis.io in the background on a bounded
+    worker pool, so the next download starts while the previous package is
+    uploaded. Files are uploaded from disk. Failed transfers are retried
+    with a jittered backoff. The pending uploads are persisted in the output
+    folder and submitted again by the next run, so a package that could not
+    be uploaded (or a run that was interrupted) is not lost.
+    """
+
+    def __init__(self, logger, path, workers=2):
+        """
+        Initialize the UploadQueue class.
+
+        :param logger: Logger used to report the uploads.
+        :param path: Output folder of the run, the queue is kept there.
+        :param workers: Number of concurrent uploads.
+        """
+        if not os.path.exists(path):
+            os.makedirs(path)
+        self.logger = logger
+        self.fname = os.path.join(path, ".rflat_uploads.json")
+        self.workers = max(1, int(workers))
+        self.entries = {}
+        self.futures = []
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        """read the uploads left pending by a previous run"""
+        if not os.path.isfile(self.fname):
+            return {}
+        try:
+            with open(self.fname, "r", encoding="utf-8") as file:
+                return {entry["remote"]: entry for entry in json.load(file)}
+        except (ValueError, KeyError, TypeError):
+            self.logger.error(f"Ignoring invalid upload queue:({self.fname})")
+            return {}
+
+    def save(self):
+        """persist the pending uploads (called with the lock held)"""
+        if not self.entries:
+            if os.path.exists(self.fname):
+                os.remove(self.fname)
+            return
+        part = self.fname + ".part"
+        with open(part, "w", encoding="utf-8") as file:
+            json.dump(list(self.entries.values()), file, indent=2)
+        os.replace(part, self.fname)
+
+    def start(self):
+        """
+        Start the upload workers and submit the uploads left pending by a
+        previous run.
+
+        :return: The number of pending uploads resumed.
+        """
+        self.executor = ThreadPoolExecutor(max_workers=self.workers,
+                                           thread_name_prefix="upload")
+        pending = self.load()
+        with self.lock:
+            self.entries.update(pending)
+        for entry in pending.values():
+            self.logger.info(f"({entry['remote']}):Resuming upload of {entry['source']} "
+                             f"queued {entry['queued']}")
+            self.futures.append(self.executor.submit(self.upload, entry))
+        return len(pending)
+
+    def sources(self):
+        """
+        :return: The set of files waiting for upload.
+        """
+        with self.lock:
+            return {entry["source"] for entry in self.entries.values()}
+
+    def submit(self, source, remote_name, remove=False):
+        """
+        Queue a file for upload.
+
+        :param source: The file to upload.
+        :param remote_name: The name of the file on redis.io.
+        :param remove: Delete the file once uploaded (a staged package).
+        """
+        entry = {"source": os.path.abspath(source), "remote": os.path.basename(remote_name),
+                 "remove": remove, "queued": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+        with self.lock:
+            self.entries[entry["remote"]] = entry
+            self.save()
+        self.futures.append(self.executor.submit(self.upload, entry))
+
+    def done(self, entry):
+        """drop an entry from the queue"""
+        with self.lock:
+            self.entries.pop(entry["remote"], None)
+            self.save()
+
+    def upload(self, entry):
+        """
+        Upload a queued file.
+
+        :return: True if the file was uploaded.
+        """
+        source, remote = entry["source"], entry["remote"]
+        if not os.path.isfile(source):
+            self.logger.error(f"({remote}):Upload abandoned, {source} no longer exists")
+            self.done(entry)
+            return False
+        try:
+            size, rate = FilesUploader.upload_with_retry(self.logger, source, remote)
+        except Exception as e:
+            self.logger.exception(
+                e, f"({remote}):Upload failed, kept in {self.fname} for the next run")
+            return False
+        self.logger.info(f"({remote}):Uploaded to redis.io ({size}MB at {rate}MB/s)")
+        self.done(entry)
+        if entry["remove"]:
+            try:
+                os.remove(source)
+            except OSError as e:
+                self.logger.exception(e, f"({remote}):Could not remove staged file {source}")
+        return True
+
+    def close(self):
+        """
+        Wait for the queued uploads.
+
+        :return: A tuple containing the number of uploaded and failed files.
+        """
+        if self.executor is None:
+            return 0, 0
+        self.executor.shutdown(wait=True)
+        results = []
+        for future in self.futures:
+            error = future.exception()
+            if error is not None:
+                self.logger.exception(error, "Upload worker failed")
+            results.append(error is None and future.result())
+        return results.count(True), results.count(False)
@@ -1,19 +1,34 @@
 #!/usr/bin/env python3
 import argparse
+import multiprocessing
 from datetime import datetime
 import os
 import re
 import json
+import sqlite3
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from lib.support_package import SupportPackage
 from lib.credential_vault import CredentialVault
 from lib.excel_report_generator import ExcelReportGenerator
 from lib.logger import Logger
 from lib.fqdns import FQDNs
 from lib.resolver import Resolver
-
-def sort_and_keep_latest_files(logger, folder_path, file_prefix, n):
-    """expunge old files"""
+from lib.fleet_runner import FleetRunner
+from lib.inventory_collector import InventoryCollector
+from lib.inventory_store import InventoryStore
+from lib.run_journal import RunJournal
+from lib.partial_inventory import PartialInventory
+from lib.http_session import HttpSessions
+from lib.api_cache import ApiCache
+from lib.resilience import RetryPolicy
+from lib.request_scheduler import RequestScheduler
+from lib.compressors import Compressors
+from lib.reduction_policy import ReductionPolicy
+from lib.upload_queue import UploadQueue
+
+def sort_and_keep_latest_files(logger, folder_path, file_prefix, n, exclude=None):
+    """expunge old files, except the paths in exclude (queued for upload)"""
     # Get a list of all files in the folder
     all_files = os.listdir(folder_path)
 
@@ -32,6 +47,9 @@ def sort_and_keep_latest_files(logger, folder_path, file_prefix, n):
     for file in matched_files:
         if file not in files_to_keep:
             fname = os.path.join(folder_path, file)
+            if exclude and os.path.abspath(fname) in exclude:
+                logger.info(f"Keeping Old Version Until Uploaded:({fname})")
+                continue
             logger.info(f"Purging Old Version:({fname})")
             os.remove(fname)
 
@@ -46,20 +64,90 @@ def get_fname(path):
     return os.path.join(path, fname)
 
 
-def xls(logger, fqdns, resolver, path):
-    """Generate xls file for inventory"""
-    clusters = []
-    certificates = []
-    roles = []
-    acls = []
-    permissions = []
-    nodes = []
-    databases = []
-    ciphers = []
-    shards = []
-
-    # Create a new instance of the generator
-    generator = ExcelReportGenerator()
+def collect_cluster(collector, store, fqdn, ip, user, pwd, incremental):
+    """
+    collect the inventory of a cluster; in incremental mode, unchanged
+    clusters reuse the reusable sheets (shards) of their last stored
+    inventory and the other sheets are rebuilt from fresh responses
+
+    :return: A tuple containing the inventory, its fingerprint and the
+             cluster status (new, changed, unchanged or collected).
+    """
+    if store is None:
+        return collector.collect(fqdn, ip, user, pwd), None, "collected"
+
+    if incremental:
+        fingerprint = collector.fingerprint(fqdn, ip, user, pwd)
+        previous = store.get_fingerprint(fqdn)
+        if previous is not None and previous[1] == fingerprint:
+            inventory = store.load_inventory(previous[0], fqdn)
+            if inventory is not None:
+                reuse = {sheet: inventory[sheet] for sheet in InventoryCollector.reusable
+                         if sheet in inventory}
+                # the fingerprint responses come from the api cache
+                return (collector.collect(fqdn, ip, user, pwd, reuse=reuse), fingerprint,
+                        "unchanged")
+        status = "new" if previous is None else "changed"
+        return collector.collect(fqdn, ip, user, pwd), fingerprint, status
+
+    inventory = collector.collect(fqdn, ip, user, pwd)
+    # the fingerprint endpoints were just collected and come from the api cache
+    return inventory, collector.fingerprint(fqdn, ip, user, pwd), "collected"
+
+
+def learn_nodes(logger, fqdns, resolver, passwords):
+    """add the node addresses of each cluster (from /v1/nodes) to the resolver"""
+    def learn(fqdn):
+        user, pwd = passwords[fqdn]
+        nodes = InventoryCollector.fetch(fqdn, resolver.get(fqdn), user, pwd, "/v1/nodes")
+        return resolver.learn_nodes(fqdn, nodes)
+
+    targets = [fqdn for fqdn in fqdns if fqdn in passwords]
+    with ThreadPoolExecutor(max_workers=HttpSessions.pool_size) as executor:
+        futures = {executor.submit(learn, fqdn): fqdn for fqdn in targets}
+        for future, fqdn in futures.items():
+            try:
+                learned = future.result()
+                logger.info(f"({fqdn}):Learned {learned} node addresses")
+            except Exception as e:
+                logger.exception(e, f"({fqdn}):Error learning node addresses")
+
+
+def probe_clusters(logger, fqdns, resolver):
+    """probe the addresses of every cluster and route to the fastest healthy one"""
+    report = resolver.probe(fqdns)
+    unreachable = [fqdn for fqdn, results in report.items()
+                   if all(elapsed is None for _address, elapsed in results)]
+    for fqdn in unreachable:
+        logger.error(f"({fqdn}):No reachable address")
+    logger.info(f"Probed {len(report)} clusters, {len(unreachable)} unreachable")
+
+
+def start_uploads(logger, args, path):
+    """background upload queue of a support package run, or None"""
+    if not args.upload or args.dryrun or args.bloat or args.list or args.license or args.xls:
+        return None
+    uploads = UploadQueue(logger, path, workers=args.upload_workers)
+    pending = uploads.start()
+    if pending:
+        logger.info(f"Resuming {pending} pending uploads")
+    return uploads
+
+
+def finish_uploads(logger, uploads):
+    """wait for the background uploads and report them"""
+    if uploads is None:
+        return
+    logger.info("Waiting for pending uploads")
+    uploaded, failed = uploads.close()
+    logger.info(f"Uploaded {uploaded} packages, {failed} failed")
+
+
+def create_inventory_workbook():
+    """create the generator and the sheets of an inventory workbook"""
+    # Create a new instance of the generator, rows are streamed so memory
+    # use does not grow with the size of the fleet
+    generator = ExcelReportGenerator(write_only=True)
 
     # Create a new workbook and add data
     generator.create_workbook()
@@ -74,146 +162,254 @@ def xls(logger, fqdns, resolver, path):
     generator.create_sheet("Ciphers",tab_color="591523")
 
     generator.create_sheet("Databases",tab_color="154859")
+    return generator
+
+
+def xls(logger, fqdns, resolver, path, credentials=None, store=None, incremental=False,
+        journal=None, partial=None):
+    """
+    Generate xls file for inventory (and an inventory store snapshot)
+
+    :param journal: RunJournal recording each cluster, clusters it holds as
+                    completed are added to the report from the journal.
+    :param partial: PartialInventory receiving the inventory of each cluster
+                    (sharded sweeps).
+    :return: A dictionary of cluster status to list of fqdns.
+    """
+    if credentials is None:
+        credentials = CredentialVault.decrypt_many(fqdns)
+    passwords, errors = credentials
+
+    generator = create_inventory_workbook()
+
+    snapshot_id = store.begin_snapshot() if store is not None else None
+    collector = InventoryCollector()
+    summary = {}
     for fqdn in fqdns:
         try:
-            user, pwd = CredentialVault.decrypt_credentials(fqdn)
-            ip = resolver.get(fqdn)
-            # get license and node info for cluster sheet
-            logger.info(f"Processing Data for:({fqdn})")
-
-            response = SupportPackage.get_license_info(fqdn,ip, user, pwd)
-            redis_license = json.loads(response)
-
-            cluster_data = SupportPackage.get_cluster_info(fqdn,ip, user,pwd)
-            cluster_json = json.loads(cluster_data)
-            
-            bdb_data = SupportPackage.get_bdbs(fqdn,ip,user,pwd)
-            bdb_json = json.loads(bdb_data)
-
-            fqdn_roles, fqdn_acls, fqdn_permissions = SupportPackage.get_roles_acls(bdb_json,fqdn,ip,user,pwd)
-            roles.extend(fqdn_roles)
-            acls.extend(fqdn_acls)
-            permissions.extend(fqdn_permissions)
-        
-            fqdn_certificates = SupportPackage.get_certificate_info(fqdn,bdb_json,cluster_json)
-            certificates.extend(fqdn_certificates)
-
-            nodeinfo = SupportPackage.summarize_node_info(fqdn,ip, user, pwd)
-
-            cluster = {}
-            cluster["fqdn"] = fqdn
-            cluster["cluster_name"] = redis_license['cluster_name']
-            cluster["license_owner"] = redis_license['owner']
-            cluster["version"] = nodeinfo["version"]
-            cluster["os"] = nodeinfo["os"]
-            cluster["rack aware"]=cluster_json["rack_aware"]
-            cluster["features"] = ""
-            for feature in redis_license["features"]:
-                cluster["features"] += feature + " "
-
-            cluster["activated"] = SupportPackage.convert_zulu_string(
-                redis_license["activation_date"]
-            )
-            cluster["expiration"] = SupportPackage.convert_zulu_string(
-                redis_license["expiration_date"]
-            )
-            cluster["expired"] = redis_license["expired"]
-            cluster["shard_limit"] = redis_license["shards_limit"]
-            cluster["ram_shards"] = redis_license["ram_shards_in_use"]
-            cluster["rof_shards"] = redis_license["flash_shards_in_use"]
-            cluster["nodes"] = nodeinfo["nodes"]
-            cluster["version_mismatch"] = nodeinfo["mismatch"]
-            clusters.append(cluster)
-
-            fqdn_nodes = SupportPackage.get_nodes(fqdn,ip,user,pwd)
-            nodes.extend(fqdn_nodes)   
-
-            fqdn_shards = SupportPackage.get_shard_info(bdb_json,fqdn,ip,user,pwd)            
-            shards.extend(fqdn_shards)
-
-            bdb_data = SupportPackage.deserialize_bdb_info(fqdn,bdb_json)
-            databases.extend(bdb_data)
-            
-            fqdn_ciphers = SupportPackage.get_ciphers(fqdn,cluster_json)            
-            ciphers.extend(fqdn_ciphers)
+            entry = journal.completed(fqdn) if journal is not None else None
+            if entry is not None:
+                inventory, fingerprint, status = (
+                    entry["inventory"], entry.get("fingerprint"), "resumed")
+            else:
+                if fqdn in errors:
+                    raise errors[fqdn]
+                user, pwd = passwords[fqdn]
+                ip = resolver.get(fqdn)
+                logger.info(f"Processing Data for:({fqdn})")
+
+                # a cluster is added to the report only when all its data was collected
+                inventory, fingerprint, status = collect_cluster(
+                    collector, store, fqdn, ip, user, pwd, incremental)
+                if journal is not None:
+                    journal.record(fqdn, "done", fingerprint=fingerprint, inventory=inventory)
+            for sheet in InventoryCollector.sheets:
+                generator.add_data(sheet, inventory.get(sheet, []))
+                if store is not None:
+                    store.add_rows(snapshot_id, sheet, inventory.get(sheet, []))
+            if store is not None and fingerprint is not None:
+                store.save_inventory(snapshot_id, fqdn, fingerprint, inventory)
+            if partial is not None:
+                partial.add(fqdn, inventory)
 
-    
         except Exception as e:
             logger.exception(e, f"Error during Request for {fqdn}")
-
-    # add licenses to cluster worksheet
-    generator.add_data("Clusters", clusters)
-    generator.add_data("Nodes", nodes)
-    generator.add_data("Shards",shards)
-    generator.add_data("Certificates",certificates)
-    generator.add_data("Ciphers",ciphers)
-    generator.add_data("Roles",roles)
-    generator.add_data("Acls",acls)
-    generator.add_data("Permissions",permissions)
-    generator.add_data("Databases",databases)
+            status = "failed"
+            if journal is not None:
+                journal.record(fqdn, "failed", error=str(e))
+        finally:
+            # the responses of a cluster are only reused while it is collected
+            ApiCache.forget(fqdn)
+        summary.setdefault(status, []).append(fqdn)
+
+    if summary.get("resumed"):
+        logger.info(f"Resumed {len(summary['resumed'])} clusters from the run journal")
+
+    if incremental:
+        for status in ("new", "changed", "unchanged", "failed"):
+            for fqdn in summary.get(status, []):
+                logger.info(f"({fqdn}):{status.capitalize()}")
+        logger.info(", ".join(f"{status}={len(summary.get(status, []))}"
+                              for status in ("new", "changed", "unchanged", "failed")))
     
     # save the workbook
     file_name = generator.save_workbook(get_fname(path))
     logger.info(f"Workbook saved as '{file_name}'.")
 
-def process(logger, fqdn, ip, user, pwd, path, args):
-    '''process a command'''
-    if args.list:
-        try:
-            bdb_data = SupportPackage.get_bdbs(fqdn, ip, user, pwd)
-            bdb_json = json.loads(bdb_data)
-            if args.json:
-                bdb_info = SupportPackage.deserialize_bdb_info(fqdn,bdb_json)
-                bdb = {}
-                bdb["cluster"] = fqdn
-                bdb["databases"] = bdb_info
-                print(json.dumps(bdb, indent=4))
-            else:
-                SupportPackage.tablulate_bdb_info(fqdn, bdb_json)
-        except Exception as e:
-            logger.exception(e, f"{fqdn}-Error Processing Command")
-    elif args.license:
-        response = SupportPackage.get_license_info(fqdn, ip, user, pwd)
-        redis_license = SupportPackage.deserialize_license_info(fqdn, response)
-        print(json.dumps(redis_license, indent=4))
-    else:
+    if store is not None:
+        store.commit()
+        logger.info(f"Inventory snapshot {snapshot_id} saved in '{store.db_file}'.")
+    return summary
+
+
+def print_table(columns, rows):
+    """print query results as a table"""
+    widths = [len(column) for column in columns]
+    for row in rows:
+        for col, value in enumerate(row):
+            widths[col] = max(widths[col], len(str(value)))
+    print(" ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    print(" ".join("-" * width for width in widths))
+    for row in rows:
+        print(" ".join(str(value).ljust(width) for value, width in zip(row, widths)))
+
+
+def merge(argv):
+    """merge the partial inventories of a sharded sweep into one workbook"""
+    parser = argparse.ArgumentParser(
+        prog="rflat merge",
+        description="Merge partial inventories (--xls --shard) into one inventory workbook"
+    )
+    parser.add_argument("partials", nargs="+", help="Partial inventory files")
+    parser.add_argument("--path", help="Folder path for saving the workbook")
+    args = parser.parse_args(argv)
+
+    logger = Logger(
+        name="MyLogger", facility="rflat", log_to_file=False, filename="logs/app"
+    )
+
+    path = args.path if args.path else "output"
+    generator = create_inventory_workbook()
+    merged = set()
+    shards = {}
+    for fname in args.partials:
+        # a truncated or corrupt file fails while its clusters are read
         try:
-            if args.bloat:
-                reduce_tar_size = False
-            else:
-                logger.info(f"({fqdn}):Agressively Optimizing Support Package Size")
-                reduce_tar_size = True
+            header, clusters = PartialInventory.read(fname)
+            index, count = header["shard"]
+            shards.setdefault(count, set()).add(index)
+            for fqdn, inventory in clusters:
+                if fqdn in merged:
+                    logger.error(f"({fqdn}):Duplicate in ({fname}), skipped")
+                    continue
+                merged.add(fqdn)
+                for sheet in InventoryCollector.sheets:
+                    generator.add_data(sheet, inventory.get(sheet, []))
+        except (OSError, EOFError, ValueError, KeyError, TypeError) as e:
+            logger.error(f"Invalid Partial Inventory:({fname}):{e}")
+            sys.exit(-1)
 
-            save_to_file = True
+    for count, indexes in shards.items():
+        missing = sorted(set(range(1, count + 1)) - indexes)
+        if missing:
+            logger.error(f"Missing shards of {count}:{', '.join(str(i) for i in missing)}")
 
-            if args.nosave:
-                if args.upload:
-                    logger.info(f"({fqdn}):Support Package will not be saved to disk")
-                    save_to_file = False
+    file_name = generator.save_workbook(get_fname(path))
+    logger.info(f"Merged {len(merged)} clusters from {len(args.partials)} partial inventories")
+    logger.info(f"Workbook saved as '{file_name}'.")
 
-            db = 0 if (args.db is None) else args.db
 
-            SupportPackage.download_package(
-                logger,
-                fqdn,
-                ip,
-                user,
-                pwd,
-                path,
-                db,
-                reduce_tar_size,
-                save_to_file=save_to_file,
-                upload=args.upload,
-                dry_run=args.dryrun,
-            )
+def query(argv):
+    """query the inventory store"""
+    parser = argparse.ArgumentParser(
+        prog="rflat query", description="Query the inventory history store"
+    )
+    parser.add_argument("sql", nargs="?", help="SQL query (default: list snapshots)")
+    parser.add_argument(
+        "--store",
+        default=InventoryStore.db_file,
+        help=f"Inventory history database (default {InventoryStore.db_file})",
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="Format query output in Json"
+    )
+    args = parser.parse_args(argv)
 
-            keep = int(args.keep) if (args.keep is not None) else 1
+    logger = Logger(
+        name="MyLogger", facility="rflat", log_to_file=False, filename="logs/app"
+    )
 
-            sort_and_keep_latest_files(logger, path, f"debuginfo.{fqdn}", keep)
+    if not os.path.isfile(args.store):
+        logger.error(f"Inventory store not found:({args.store})")
+        sys.exit(-1)
 
-        except Exception as e:
-            logger.exception(e, f"({fqdn}):Fatal Error")
-    return
+    sql = args.sql if args.sql else "SELECT * FROM snapshots ORDER BY id"
+    store = InventoryStore(args.store, read_only=True)
+    try:
+        columns, rows = store.query(sql)
+    except sqlite3.Error as e:
+        logger.error(f"Query Error:{e}")
+        sys.exit(-1)
+    finally:
+        store.close()
+
+    if args.json:
+        print(json.dumps([dict(zip(columns, row)) for row in rows], indent=4))
+    else:
+        print_table(columns, rows)
+
+def process(logger, fqdn, ip, user, pwd, path, args, runner):
+    '''
+    process a command
+    errors are raised to the caller (logged per cluster by the fleet runner)
+    '''
+    try:
+        process_command(logger, fqdn, ip, user, pwd, path, args, runner)
+    finally:
+        # the responses of a cluster are only reused while it is processed
+        ApiCache.forget(fqdn)
+
+
+def process_command(logger, fqdn, ip, user, pwd, path, args, runner):
+    '''run the command of the run for a cluster'''
+    if args.list:
+        bdb_data = SupportPackage.get_bdbs(fqdn, ip, user, pwd)
+        bdb_json = json.loads(bdb_data)
+        if args.json:
+            bdb_info = SupportPackage.deserialize_bdb_info(fqdn,bdb_json)
+            bdb = {}
+            bdb["cluster"] = fqdn
+            bdb["databases"] = [dict(rec) for rec in bdb_info]
+            with runner.output_lock:
+                print(json.dumps(bdb, indent=4))
+        else:
+            with runner.output_lock:
+                SupportPackage.tablulate_bdb_info(fqdn, bdb_json)
+    elif args.license:
+        response = SupportPackage.get_license_info(fqdn, ip, user, pwd)
+        redis_license = SupportPackage.deserialize_license_info(fqdn, response)
+        with runner.output_lock:
+            print(json.dumps(redis_license, indent=4))
+    else:
+        if args.bloat:
+            reduce_tar_size = False
+        else:
+            logger.info(f"({fqdn}):Agressively Optimizing Support Package Size")
+            reduce_tar_size = True
+
+        save_to_file = True
+
+        if args.nosave:
+            if args.upload:
+                logger.info(f"({fqdn}):Support Package will not be saved to disk")
+                save_to_file = False
+
+        db = 0 if (args.db is None) else args.db
+
+        # debuginfo pulls are bounded by the heavy cap of the request scheduler
+        SupportPackage.download_package(
+            logger,
+            fqdn,
+            ip,
+            user,
+            pwd,
+            path,
+            db,
+            reduce_tar_size,
+            save_to_file=save_to_file,
+            upload=args.upload,
+            dry_run=args.dryrun,
+            tar_options=args.tar_options,
+            report_rules=args.policy_report,
+            uploads=args.uploads,
+        )
+
+        keep = int(args.keep) if (args.keep is not None) else 1
+
+        # escaped and anchored so that a.net does not purge the files of a.net.au
+        sort_and_keep_latest_files(
+            logger, path, f"{re.escape('debuginfo.' + fqdn)}_", keep,
+            exclude=args.uploads.sources() if args.uploads is not None else None)
 
 #
 # Process command arguments for specified fqdn
@@ -238,7 +434,7 @@ def process_args_single_fqdn(logger, fqdn, ip, args, path):
             logger.exception(e, "Fatal Error")
             sys.exit(-1)
     try:
-        process(logger, fqdn, ip, user, pwd, path, args)
+        process(logger, fqdn, ip, user, pwd, path, args, FleetRunner(logger))
     except Exception as e:
         logger.exception(e,"Fatal Error")
         sys.exit(-1)
@@ -269,12 +465,49 @@ def main():
         action="store_true",
         help="Do not save support package to disk (works only with --upload",
     )
+    parser.add_argument(
+        "--upload-workers",
+        type=int,
+        default=2,
+        help="Number of concurrent uploads to Redis.io (default 2)",
+    )
     parser.add_argument("--keep", help="Number of Output files to keep")
     parser.add_argument(
         "--bloat",
         action="store_true",
         help="Make no attempt to reduce the Package Size",
     )
+    parser.add_argument(
+        "--nested",
+        action="store_true",
+        help="Reduce nested archives and compressed logs instead of removing them",
+    )
+    parser.add_argument(
+        "--policy",
+        help="Reduction policy file (json)",
+    )
+    parser.add_argument(
+        "--policy-report",
+        action="store_true",
+        help="Log the size saved by each reduction rule",
+    )
+    parser.add_argument(
+        "--compress",
+        choices=Compressors.available(),
+        default="gz",
+        help="Compression of reduced support packages (default gz)",
+    )
+    parser.add_argument(
+        "--level",
+        type=int,
+        help="Compression level of reduced support packages",
+    )
+    parser.add_argument(
+        "--buffer",
+        type=int,
+        default=1,
+        help="Streaming buffer size in MB for support package downloads (default 1)",
+    )
     parser.add_argument("--dryrun", action="store_true", help="Do a dryrun for testing")
     parser.add_argument(
         "--list", action="store_true", help="List Databases Id and Names"
@@ -290,6 +523,99 @@ def main():
         action="store_true",
         help="Generate Excel Inventory Report For All Clusters",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of clusters to process in parallel (default 1)",
+    )
+    parser.add_argument(
+        "--budget",
+        type=int,
+        help="Maximum concurrent support package downloads (default --workers)",
+    )
+    parser.add_argument(
+        "--max-requests",
+        type=int,
+        default=RequestScheduler.global_limit,
+        help=f"Maximum concurrent REST API requests of the run (default {RequestScheduler.global_limit})",
+    )
+    parser.add_argument(
+        "--cluster-requests",
+        type=int,
+        default=RequestScheduler.cluster_limit,
+        help="Maximum concurrent REST API requests per cluster, adjusted to the "
+             f"cluster response times (default {RequestScheduler.cluster_limit})",
+    )
+    parser.add_argument(
+        "--store",
+        default=InventoryStore.db_file,
+        help=f"Inventory history database updated by --xls (default {InventoryStore.db_file})",
+    )
+    parser.add_argument(
+        "--nostore",
+        action="store_true",
+        help="Do not save the --xls inventory in the history database",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Reuse the stored --xls inventory of clusters that did not change",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=int,
+        default=0,
+        help="Reuse REST API responses cached on disk for up to CACHE_TTL seconds",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Use only cached REST API responses (with --list, --license or --xls)",
+    )
+    parser.add_argument(
+        "--shard",
+        help="Process the i-th of N shards of the matched clusters (i/N, for example 2/3)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Resume an interrupted --xls or support package sweep from its run journal",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=RetryPolicy.attempts,
+        help=f"Attempts per REST API request (default {RetryPolicy.attempts})",
+    )
+    parser.add_argument(
+        "--json-timeout",
+        type=int,
+        default=HttpSessions.timeouts["json"][1],
+        help=f"Read timeout in seconds of json requests (default {HttpSessions.timeouts['json'][1]})",
+    )
+    parser.add_argument(
+        "--debuginfo-timeout",
+        type=int,
+        default=HttpSessions.timeouts["debuginfo"][1],
+        help="Read timeout in seconds of support package requests "
+             f"(default {HttpSessions.timeouts['debuginfo'][1]})",
+    )
+    parser.add_argument(
+        "--noprobe",
+        action="store_true",
+        help="Do not probe cluster addresses before a wildcard run",
+    )
+    parser.add_argument(
+        "--learn-nodes",
+        action="store_true",
+        help="Add the node addresses of each cluster (/v1/nodes) to resolver.json",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="Report per endpoint REST API latency at the end of the run",
+    )
 
     logger = Logger(
         name="MyLogger", facility="rflat", log_to_file=False, filename="logs/app"
@@ -305,6 +631,59 @@ def main():
     else:
         path = "output"
 
+    try:
+        policy = None
+        if args.policy:
+            policy = ReductionPolicy.load(args.policy, nested=args.nested)
+    except Exception as e:
+        logger.exception(e, f"Invalid Policy File:({args.policy})")
+        return
+
+    # background upload queue, started with the support package downloads
+    args.uploads = None
+
+    # reduction settings shared by every support package of the run
+    args.tar_options = {
+        "buffer_size": args.buffer * 1024 * 1024,
+        "nested": args.nested,
+        "compression": args.compress,
+        "compress_level": args.level,
+        "policy": policy,
+    }
+
+    if args.offline and not (args.list or args.license or args.xls):
+        logger.error("--offline requires --list, --license or --xls")
+        return
+
+    shard = None
+    if args.shard:
+        try:
+            shard = FQDNs.parse_shard(args.shard)
+        except ValueError as e:
+            logger.error(str(e))
+            return
+
+    if args.resume and (args.list or args.license) and not args.xls:
+        logger.error("--resume requires --xls or a support package sweep")
+        return
+
+    if args.resume and args.dryrun and not args.xls:
+        logger.error("--resume cannot be used with --dryrun")
+        return
+
+    if args.incremental and (args.nostore or args.offline):
+        logger.error("--incremental requires the inventory store (not --nostore or --offline)")
+        return
+
+    ApiCache.configure(ttl=args.cache_ttl, offline=args.offline)
+    RetryPolicy.configure(attempts=args.retries)
+    RequestScheduler.configure(global_limit=args.max_requests,
+                               cluster_limit=args.cluster_requests,
+                               heavy_limit=args.budget if args.budget else args.workers)
+    HttpSessions.timeouts["json"] = (HttpSessions.timeouts["json"][0], args.json_timeout)
+    HttpSessions.timeouts["debuginfo"] = (HttpSessions.timeouts["debuginfo"][0],
+                                          args.debuginfo_timeout)
+
     fqdn = args.fqdn if args.fqdn != "." else "*"
 
     fqdns = FQDNs.get(fqdn)
@@ -318,23 +697,126 @@ def main():
                 if fqdns[0] != fqdn:
                     logger.error(f"fqdn {fqdn} is not compatible with --user")
                     return
+            args.uploads = start_uploads(logger, args, path)
             process_args_single_fqdn(logger, fqdn, resolver.get(fqdn), args, path)
+            finish_uploads(logger, args.uploads)
     elif len(fqdns) == 0:
         logger.error("no matches found")
     else:
+        journal_suffix = ""
+        if shard is not None:
+            # deterministic split of the match set across several runners
+            fqdns = FQDNs.shard(fqdns, *shard)
+            logger.info(f"Shard {shard[0]}/{shard[1]}:{len(fqdns)} clusters")
+            # an empty shard still writes its (empty) partial inventory
+            if not fqdns and not args.xls:
+                return
+            journal_suffix = f"_{shard[0]}of{shard[1]}"
+
+        # unlock the vault once and decrypt every matched cluster up front
+        try:
+            credentials = CredentialVault.decrypt_many(fqdns)
+        except Exception as e:
+            logger.exception(e, "Fatal Error")
+            return
+        passwords, errors = credentials
+
+        if not args.offline:
+            if args.learn_nodes:
+                learn_nodes(logger, fqdns, resolver, passwords)
+            if not args.noprobe:
+                probe_clusters(logger, fqdns, resolver)
+            if resolver.dirty:
+                resolver.persist()
+
+        # support package and inventory sweeps keep a journal of completed
+        # clusters so an interrupted sweep can be resumed (a dry run
+        # downloads nothing, it must not mark clusters as completed)
+        journal = None
+        if args.xls or not (args.list or args.license or args.dryrun):
+            journal = RunJournal(
+                path, ("xls" if args.xls else "packages") + journal_suffix, fqdn)
+            resumed = journal.open(resume=args.resume)
+            if args.resume:
+                logger.info(f"Resuming sweep, {resumed} clusters already completed")
+
         if not args.xls:
-            for fqdn in fqdns:
+            runner = FleetRunner(logger, workers=args.workers)
+            # packages are uploaded while the next clusters are downloaded
+            args.uploads = start_uploads(logger, args, path)
+
+            def task(fqdn):
+                if journal is not None and journal.completed(fqdn):
+                    logger.info(f"({fqdn}):Completed by the previous run, skipped")
+                    return
+                if fqdn in errors:
+                    raise errors[fqdn]
+                user, pwd = passwords[fqdn]
                 try:
-                    user, pwd = CredentialVault.decrypt_credentials(fqdn)
-                    process(logger, fqdn, resolver.get(fqdn), user, pwd, path, args)
-                except Exception as e:
-                    logger.exception(e, f"({fqdn}):Error during Request")
+                    process(logger, fqdn, resolver.get(fqdn), user, pwd, path, args, runner)
+                except Exception:
+                    if journal is not None:
+                        journal.record(fqdn, "failed")
+                    raise
+                if journal is not None:
+                    journal.record(fqdn, "done")
+
+            _succeeded, failed = runner.run(fqdns, task)
+            finish_uploads(logger, args.uploads)
+            if runner.workers > 1:
+                logger.info(f"Processed {len(fqdns)} clusters, {len(failed)} failed")
+                for fqdn in sorted(failed):
+                    error = runner.errors[fqdn]
+                    logger.error(f"({fqdn}):Failed:{getattr(error, 'kind', type(error).__name__)}")
+            if journal is not None:
+                # keep the journal while clusters remain to be resumed
+                journal.close(remove=journal.is_complete(fqdns))
         else:
-            xls(logger, fqdns, resolver, path)
+            # offline reports re-slice data that is already in the store
+            store = None
+            if not (args.nostore or args.offline):
+                store = InventoryStore(args.store)
+            # each runner of a sharded sweep also writes a partial inventory for merge
+            partial = None
+            if shard is not None:
+                partial = PartialInventory(PartialInventory.get_fname(path, shard), shard, fqdn)
+            try:
+                xls(logger, fqdns, resolver, path, credentials, store, args.incremental,
+                    journal, partial)
+                if partial is not None:
+                    partial.close()
+                    logger.info(f"Partial inventory saved as '{partial.fname}'.")
+            finally:
+                if partial is not None:
+                    # removes the incomplete .part file if xls failed
+                    partial.abort()
+                if store is not None:
+                    store.close()
+                # keep the journal while clusters remain to be resumed
+                journal.close(remove=journal.is_complete(fqdns))
             keep = int(args.keep) if (args.keep is not None) else 5
             sort_and_keep_latest_files(logger, path, "inventory", keep)
+            if shard is not None:
+                sort_and_keep_latest_files(
+                    logger, path, f"partial_inventory_{shard[0]}of{shard[1]}", keep)
 
+    if args.timings:
+        for stats in HttpSessions.latency_report():
+            logger.info(
+                f"{stats['endpoint']}:requests={stats['requests']} avg={stats['avg_ms']}ms "
+                f"min={stats['min_ms']}ms max={stats['max_ms']}ms")
+        for stats in RequestScheduler.report():
+            logger.info(
+                f"{stats['cluster']}:concurrency={stats['limit']} lowest={stats['lowest']} "
+                f"decreases={stats['decreases']}")
 
-if __name__ == "__main__":
 
-    main()
+if __name__ == "__main__":
+    # nested archives are reduced on a process pool (frozen executables)
+    multiprocessing.freeze_support()
+    if len(sys.argv) > 1 and sys.argv[1] == "query":
+        query(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "merge":
+        merge(sys.argv[2:])
+    else:
+        main()
@@ -2,75 +2,128 @@
 '''unbloat - a utility to manipulate support packages'''
 
 import argparse
+import multiprocessing
 import os
+import sys
+import tempfile
 from pathlib import Path
 from lib.tar_processor import TarProcessor
 from lib.files_uploader import FilesUploader
+from lib.compressors import Compressors
+from lib.reduction_policy import ReductionPolicy
 from lib.logger import Logger
 
-logger = Logger(
-    name="MyLogger", facility="unbloat", log_to_file=False, filename="logs/app"
-)
-# Set up argument parser
-parser = argparse.ArgumentParser(
-    description="Remove Bloat from Support Packages")
-parser.add_argument("file", help="Path to the file")
-parser.add_argument("--bloat", action="store_true", help="Leave it Bloated")
-parser.add_argument("--upload", action="store_true", help="upload to redis.io")
-parser.add_argument("--nosave", action="store_true", help="Do not save")
-
-# Parse the arguments
-args = parser.parse_args()
-
-# Extract and print the filename
-filename = os.path.basename(args.file)
-print(f"Filename:({filename})")
-
-FILE_BYTES = None
-UPLOAD_BYTES = None
-NOSAVE = False
-
-# Read the file in binary mode and store it as bytes
-try:
-    with open(args.file, "rb") as f:
-        FILE_BYTES = f.read()
-except FileNotFoundError as e:
-    logger.exception(e, "Error: File not found.")
-except IOError:
-    print("Error: Could not read the file.")
-
-
-# Check if the bloat flag is set
-if not args.bloat:
-    NOSAVE = args.nosave
-    tar_processor_bytes = TarProcessor()
-    savings, original_size, new_size, UPLOAD_BYTES = (
-        tar_processor_bytes.process_from_bytes(FILE_BYTES)
+
+def main():
+    '''main function'''
+    logger = Logger(
+        name="MyLogger", facility="unbloat", log_to_file=False, filename="logs/app"
     )
-    logger.info(f"Original tar size: {original_size}MB")
-    logger.info(f"New tar size: {new_size}MB")
-    logger.info(f":Storage savings: {savings}MB")
-else:
-    UPLOAD_BYTES = FILE_BYTES
-    NOSAVE = True
-
-if args.upload:
-    logger.info(f"Uploading {filename} to Redis.io")
-    FilesUploader.upload_bytes(FILE_BYTES, filename)
-
-if NOSAVE is False:
+    # Set up argument parser
+    parser = argparse.ArgumentParser(
+        description="Remove Bloat from Support Packages")
+    parser.add_argument("file", help="Path to the file")
+    parser.add_argument("--bloat", action="store_true", help="Leave it Bloated")
+    parser.add_argument("--upload", action="store_true", help="upload to redis.io")
+    parser.add_argument("--nosave", action="store_true", help="Do not save")
+    parser.add_argument("--nested", action="store_true",
+                        help="Reduce nested archives and compressed logs instead of removing them")
+    parser.add_argument("--policy", help="Reduction policy file (json)")
+    parser.add_argument("--report", action="store_true",
+                        help="Dry run: report the size saved by each reduction rule")
+    parser.add_argument("--compress", choices=Compressors.available(), default="gz",
+                        help="Compression of the reduced package (default gz)")
+    parser.add_argument("--level", type=int, help="Compression level")
+    parser.add_argument("--buffer", type=int, default=1,
+                        help="Read/write buffer size in MB (default 1)")
+
+    # Parse the arguments
+    args = parser.parse_args()
+
+    # Extract and print the filename
+    filename = os.path.basename(args.file)
+    print(f"Filename:({filename})")
+
+    if not os.path.isfile(args.file):
+        logger.error(f"Error: File not found:({args.file})")
+        sys.exit(-1)
+
+    try:
+        policy = None
+        if args.policy:
+            policy = ReductionPolicy.load(args.policy, nested=args.nested)
+    except Exception as e:
+        logger.exception(e, f"Invalid Policy File:({args.policy})")
+        sys.exit(-1)
+
+    if args.report:
+        tar_processor = TarProcessor(
+            args.file, buffer_size=args.buffer * 1024 * 1024, nested=args.nested,
+            compression=args.compress, compress_level=args.level, policy=policy)
+        savings, original_size, new_size = tar_processor.predict()
+        for line in ReductionPolicy.format_report(tar_processor.rule_stats):
+            logger.info(line)
+        logger.info(f"Predicted new tar size: {new_size}MB")
+        logger.info(f"Predicted storage savings: {savings}MB (of {original_size}MB)")
+        return
+
     file_path = Path(args.file)
     drive = file_path.drive  # Drive (empty on Linux, e.g., "C:" on Windows)
     fname = file_path.stem  # Filename without extension
     extension = file_path.suffix  # File extension with the dot (.)
 
+    if args.compress != "gz" and not args.bloat:
+        # name the package after its new compression
+        fname = filename
+        for suffix in (".tar.gz", ".tgz", ".tar.xz", ".tar.zst", ".tar", ".gz"):
+            if fname.endswith(suffix):
+                fname = fname[:-len(suffix)]
+                break
+        extension = Compressors.suffix(args.compress)
+
     new_filename = Path(drive, file_path.parent, f"unbloat-{fname}" + extension)
+    upload_name = filename if args.compress == "gz" or args.bloat else fname + extension
+
+    upload_file = None
+    temp_file = None
+
+    # Check if the bloat flag is set
+    if not args.bloat:
+        if args.nosave:
+            # reduced package is only needed for the upload
+            handle, temp_file = tempfile.mkstemp(suffix=extension)
+            os.close(handle)
+            upload_file = temp_file
+        else:
+            upload_file = str(new_filename)
+
+        try:
+            tar_processor = TarProcessor(
+                args.file, upload_file, buffer_size=args.buffer * 1024 * 1024,
+                nested=args.nested, compression=args.compress,
+                compress_level=args.level, policy=policy)
+            savings, original_size, new_size = tar_processor.process_from_file()
+            logger.info(f"Original tar size: {original_size}MB")
+            logger.info(f"New tar size: {new_size}MB")
+            logger.info(f":Storage savings: {savings}MB")
+            if temp_file is None:
+                logger.info(f"Save:{new_filename}")
+        except IOError as e:
+            logger.exception(e, "Error: Could not write the file.")
+            sys.exit(-1)
+    else:
+        upload_file = args.file
 
     try:
-        logger.info(f"Save:{new_filename}")
-        with open(new_filename, "wb") as f:
-            f.write(FILE_BYTES)
-    except FileNotFoundError as e:
-        logger.exception(e, "Error: File not found.")
-    except IOError as e:
-        logger.exception(e, "Error: Could not write the file.")
+        if args.upload:
+            logger.info(f"Uploading {upload_name} to Redis.io")
+            FilesUploader.upload_with_retry(logger, upload_file, upload_name)
+    finally:
+        if temp_file is not None and os.path.exists(temp_file):
+            os.remove(temp_file)
+
+
+if __name__ == "__main__":
+    # nested archives are reduced on a process pool (frozen executables)
+    multiprocessing.freeze_support()
+    main()